@@ -0,0 +1,123 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+from . import metrics
+
+VERSION_KEY = "version:{scope}"
+# The format number changes whenever what is stored under the key does.
+RESPONSE_KEY = "response:2:{view}:{versions}:{digest}"
+
+CATALOG = "catalog"
+
+
+def course_scope(course_id):
+    return f"course:{course_id}"
+
+
+def get_versions(scopes):
+    """Current version number of each scope, in the order given."""
+    keys = [VERSION_KEY.format(scope=scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            found[key] = _initial_version()
+            cache.add(key, found[key], timeout=None)
+        versions.append(found[key])
+    return versions
+
+
+def bump_versions(*scopes):
+    """
+    Invalidate every cached response keyed on `scopes`.
+
+    The bump runs right away and once more after the surrounding transaction
+    commits, so a read racing the write can't cache pre-commit data under
+    the new version.
+    """
+
+    def bump():
+        for scope in scopes:
+            key = VERSION_KEY.format(scope=scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _initial_version(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _initial_version():
+    # A version that was evicted must not restart at a number an older
+    # cached response is still stored under.
+    return int(time.time() * 1000)
+
+
+class CachedResponseMixin:
+    """
+    Serves anonymous GETs of a read-only endpoint from the cache.
+
+    Responses are keyed by the full URL (host included, since file fields
+    render as absolute URLs) and by the current version of every scope from
+    `get_cache_scopes()`. Writes bump those versions instead of deleting keys.
+    Authenticated users get per-user fields, so they always bypass the cache.
+
+    The validators a conditional view set on the response are stored with
+    it, so a hit answers If-None-Match/If-Modified-Since without a query.
+    The mixin has to come before ConditionalGetMixin for that.
+    """
+
+    cache_timeout = 300
+    cache_scopes = (CATALOG,)
+    cached_headers = ("ETag", "Last-Modified", "Vary")
+
+    def get_cache_scopes(self):
+        return list(self.cache_scopes)
+
+    def get_response_cache_key(self, request):
+        scopes = self.get_cache_scopes()
+        versions = ".".join(str(version) for version in get_versions(scopes))
+        url = request.build_absolute_uri(request.path)
+        query = sorted(request.query_params.lists())
+        digest = hashlib.md5(f"{url}|{query}".encode()).hexdigest()
+        return RESPONSE_KEY.format(
+            view=type(self).__name__, versions=versions, digest=digest
+        )
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.counter("response_cache.hits").inc()
+            data, headers = cached
+            response = get_conditional_response(
+                request,
+                etag=headers.get("ETag"),
+                last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+            )
+            if response is None:
+                response = Response(data)
+            for header, value in headers.items():
+                response[header] = value
+            response["X-Cache"] = "HIT"
+            return response
+
+        metrics.counter("response_cache.misses").inc()
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {
+                header: response[header]
+                for header in self.cached_headers
+                if header in response
+            }
+            cache.set(key, (response.data, headers), self.cache_timeout)
+        response["X-Cache"] = "MISS"
+        return response
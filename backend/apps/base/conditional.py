@@ -0,0 +1,81 @@
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified support for GET, computed without serializing.
+
+    The validators come from one aggregate query: MAX(updated_at) and
+    COUNT(*) over the object (detail views) or the filtered queryset (list
+    views), plus the same pair for every lookup in `etag_related`, which
+    covers related rows that the payload embeds. Details get a strong ETag
+    and Last-Modified, lists only a weak ETag: MAX(updated_at) of a list does
+    not move when a row is deleted or leaves it, so If-Modified-Since would
+    answer 304 for a changed list. Matching requests get a 304 before any
+    serializer runs.
+    """
+
+    etag_related = ()
+
+    def is_detail_request(self):
+        return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+
+    def get_validator_queryset(self):
+        if self.is_detail_request():
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            return self.get_queryset().filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        return self.filter_queryset(self.get_queryset())
+
+    def get_etag_salt(self):
+        """Anything besides the rows themselves that changes the payload."""
+        user = self.request.user
+        return [user.pk if user.is_authenticated else None]
+
+    def get_validators(self):
+        aggregates = {"last": Max("updated_at"), "total": Count("pk", distinct=True)}
+        for related in self.etag_related:
+            aggregates[f"{related}__last"] = Max(f"{related}__updated_at")
+            aggregates[f"{related}__total"] = Count(related, distinct=True)
+        values = self.get_validator_queryset().order_by().aggregate(**aggregates)
+        if self.is_detail_request() and not values["total"]:
+            return None, None
+
+        last_modified = max(
+            (value for key, value in values.items() if key.endswith("last") and value),
+            default=None,
+        )
+        fingerprint = repr(
+            [
+                type(self).__name__,
+                self.request.get_full_path(),
+                sorted((key, str(value)) for key, value in values.items()),
+                self.get_etag_salt(),
+            ]
+        )
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        if not self.is_detail_request():
+            return f"W/{etag}", None
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+            patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
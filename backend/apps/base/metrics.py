@@ -0,0 +1,93 @@
+"""
+In-process counters, gauges and latency histograms.
+
+Values are per worker process. They are meant for debugging, benchmarks
+and exporters that scrape `snapshot()`, not for durable accounting.
+"""
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount=1):
+        with _lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with _lock:
+            self.value = value
+
+
+class Histogram:
+    """Keeps the most recent `size` observations for percentile summaries."""
+
+    def __init__(self, name, size=2048):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=size)
+
+    def observe(self, value):
+        with _lock:
+            self.count += 1
+            self.total += value
+            self.samples.append(value)
+
+    def percentile(self, fraction):
+        with _lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+def _get(cls, name):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name)
+    return metric
+
+
+def counter(name):
+    return _get(Counter, name)
+
+
+def gauge(name):
+    return _get(Gauge, name)
+
+
+def histogram(name):
+    return _get(Histogram, name)
+
+
+def snapshot(prefix=""):
+    """Current value of every metric whose name starts with `prefix`."""
+    with _lock:
+        metrics = [m for name, m in _metrics.items() if name.startswith(prefix)]
+    return {metric.name: metric.snapshot() for metric in metrics}
@@ -1,6 +1,9 @@
 from django.core.mail import send_mail
 from django.conf import settings
+import os
 import random
+import threading
+import time
 from rest_framework.exceptions import NotFound
 
 
@@ -57,3 +60,59 @@ def get_object_by_kwargs(model, kwargs: dict):
 
 def generate_random_number():
     return str(random.randint(1000000000, 9999999999))
+
+
+class SnowflakeGenerator:
+    """
+    Time-ordered 53-bit ids that can be assigned before a row is written.
+
+    40 bits of milliseconds since EPOCH_MS, 5 bits of worker id and 8 bits
+    of sequence. 53 bits keeps the ids exact as JavaScript numbers. Every
+    process writing rows needs its own SNOWFLAKE_WORKER_ID (0-31); without
+    one the process id is used, which can collide between processes, so
+    writers relying on the fallback retry a duplicate id with a new one.
+    Buffered chat persistence refuses to start without one.
+    """
+
+    EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+    WORKER_BITS = 5
+    SEQUENCE_BITS = 8
+
+    def __init__(self, worker_id=None):
+        self._worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    @property
+    def worker_id(self):
+        worker_id = self._worker_id
+        if worker_id is None:
+            worker_id = getattr(settings, "SNOWFLAKE_WORKER_ID", None)
+        if worker_id is None:
+            worker_id = os.getpid()
+        return int(worker_id) % (1 << self.WORKER_BITS)
+
+    def next_id(self):
+        with self._lock:
+            now_ms = max(int(time.time() * 1000) - self.EPOCH_MS, self._last_ms)
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) % (1 << self.SEQUENCE_BITS)
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond; borrow the next one.
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (
+                (now_ms << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (self.worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
+
+
+_snowflake = SnowflakeGenerator()
+
+
+def snowflake_id():
+    return _snowflake.next_id()
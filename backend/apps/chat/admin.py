@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatRoom, ChatMessage
+from .models import ChatRoom, ChatMessage, ChatReadMarker
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
@@ -12,3 +12,9 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'room', 'sender', 'message', 'timestamp')
     search_fields = ('room__course__title', 'sender__email', 'message')
     ordering = ('-timestamp',)
+
+
+@admin.register(ChatReadMarker)
+class ChatReadMarkerAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'room', 'last_read_id', 'updated_at')
+    search_fields = ('user__email', 'room__course__title')
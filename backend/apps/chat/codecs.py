@@ -0,0 +1,143 @@
+"""
+Wire encodings for chat sockets, negotiated through the WebSocket subprotocol.
+
+A client lists the subprotocols it understands, best first:
+
+    new WebSocket(url, ["pulikidz.msgpack+deflate", "pulikidz.json"])
+
+and the socket accepts the first one the server supports. "pulikidz.json"
+is JSON text, "pulikidz.msgpack" and "pulikidz.cbor" are binary frames, and
+a "+deflate" suffix compresses every frame with raw deflate. Sockets opened
+without a subprotocol get JSON text, as before. Clients may send their frames
+in the negotiated encoding or as JSON text.
+
+Compression is per frame rather than permessage-deflate, which is a
+WebSocket extension the ASGI server would have to negotiate.
+"""
+import json
+import zlib
+from collections import OrderedDict
+import cbor2
+import msgpack
+from django.conf import settings
+from apps.base import metrics
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+class Codec:
+    """Turns payloads into frames (str for text, bytes for binary) and back."""
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def decode(self, data, max_bytes):
+        return self.loads(data)
+
+
+class DeflateCodec(Codec):
+    """Another codec's frames, each compressed on its own."""
+
+    def __init__(self, codec):
+        self.name = f"{codec.name}+deflate"
+        self.codec = codec
+
+    def dumps(self, payload):
+        frame = self.codec.dumps(payload)
+        if isinstance(frame, str):
+            frame = frame.encode()
+        compressor = zlib.compressobj(wbits=-15)
+        return compressor.compress(frame) + compressor.flush()
+
+    def decode(self, data, max_bytes):
+        decompressor = zlib.decompressobj(wbits=-15)
+        try:
+            frame = decompressor.decompress(data, max_bytes)
+        except zlib.error as e:
+            raise ValueError(str(e))
+        if decompressor.unconsumed_tail:
+            raise FrameTooLarge(max_bytes)
+        return self.codec.loads(frame)
+
+
+JSON = Codec("pulikidz.json", json.dumps, json.loads)
+CODECS = [
+    JSON,
+    Codec(
+        "pulikidz.msgpack",
+        lambda payload: msgpack.packb(payload, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False),
+    ),
+    Codec("pulikidz.cbor", cbor2.dumps, cbor2.loads),
+]
+CODECS += [DeflateCodec(codec) for codec in list(CODECS)]
+CODECS = {codec.name: codec for codec in CODECS}
+
+
+def negotiate(subprotocols):
+    """The first of the client's subprotocols we support, or None."""
+    for name in subprotocols or ():
+        if name in CODECS:
+            return CODECS[name]
+    return None
+
+
+class FrameCache:
+    """
+    Recently encoded frames, so a message broadcast to a room is encoded
+    once per encoding in each process instead of once per member.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._frames = OrderedDict()
+
+    def get_or_encode(self, key, encode):
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            metrics.counter("chat.frames.reused").inc()
+            return frame
+        frame = self._frames[key] = encode()
+        metrics.counter("chat.frames.encoded").inc()
+        if len(self._frames) > self.size:
+            self._frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        self._frames.clear()
+
+
+frames = FrameCache()
+
+
+class CodecMixin:
+    """
+    Frame encoding for a consumer: `accept_codec()` accepts the socket with
+    the negotiated subprotocol, `decode_frame()` reads incoming frames and
+    `send_encoded()` writes frames made with `self.codec`.
+    """
+
+    codec = JSON
+
+    async def accept_codec(self):
+        codec = negotiate(self.scope.get("subprotocols"))
+        self.codec = codec or JSON
+        await self.accept(subprotocol=codec.name if codec else None)
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        if text_data is not None:
+            return json.loads(text_data)
+        if bytes_data is None:
+            raise ValueError("Empty frame.")
+        return self.codec.decode(bytes_data, getattr(settings, "CHAT_MAX_MESSAGE_BYTES", 4096))
+
+    async def send_encoded(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
@@ -1,8 +1,23 @@
-import json
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.db import IntegrityError, connection, transaction
 from .models import ChatRoom, ChatMessage
-from backend.custom_authentication import TokenManager
+from .codecs import CodecMixin, frames
+from .heartbeat import HeartbeatMixin
+from .limits import Outbox, TokenBucket, room_bucket
+from .persistence import writer as message_writer
+from .presence import tracker as presence
+from .signals import chat_user_group_name
+from .unread import mark_read, unread_counts
+from apps.base import metrics
+from apps.base.utils import snowflake_id
+from apps.courses.access import CourseAccess
+from backend.custom_authentication import TokenManager, aget_authenticated_user
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from .serializers import ChatMessageSerializer
@@ -10,86 +25,480 @@ from .serializers import ChatMessageSerializer
 User = get_user_model()
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+def room_group_name(course_id):
+    return f"chat_{course_id}"
+
+
+def notification_group_name(user_id):
+    return f"user_{user_id}"
+
+
+def message_payload(message, sender):
+    payload = {
+        "id": message.id,
+        "message": message.message,
+        "room": message.room_id,
+        "timestamp": message.timestamp.isoformat(timespec="microseconds").replace("+00:00", "Z"),
+        "sender": {
+            "id": sender.id,
+            "name": sender.name
+        }
+    }
+    if message.client_key is not None:
+        payload["client_key"] = message.client_key
+    return payload
+
+
+def parse_since(value):
+    """
+    `{course_id: message_id}` from "12:345,13:400" (query strings) or from
+    a {"12": 345} mapping (resume frames); malformed entries are skipped.
+    """
+    if isinstance(value, str):
+        value = dict(item.split(":", 1) for item in value.split(",") if ":" in item)
+    since = {}
+    for course_id, message_id in (value or {}).items():
+        try:
+            since[int(course_id)] = int(message_id)
+        except (TypeError, ValueError):
+            continue
+    return since
+
+
+async def group_add_all(channel_layer, groups, channel):
+    """Subscribe `channel` to every group at once, in bulk if the layer can."""
+    add_many = getattr(channel_layer, "group_add_many", None)
+    if add_many is not None:
+        await add_many(groups, channel)
+    else:
+        await asyncio.gather(*(channel_layer.group_add(g, channel) for g in groups))
+
+
+async def group_discard_all(channel_layer, groups, channel):
+    discard_many = getattr(channel_layer, "group_discard_many", None)
+    if discard_many is not None:
+        await discard_many(groups, channel)
+    else:
+        await asyncio.gather(
+            *(channel_layer.group_discard(g, channel) for g in groups)
+        )
+
+
+class ChatConsumer(CodecMixin, HeartbeatMixin, AsyncWebsocketConsumer):
+    # Client keys remembered per connection, so a retry is answered from memory.
+    recent_keys_size = 256
+    # Membership and unread frames; clients of plain chat sockets only know
+    # message frames and would render these as messages.
+    control_frames = False
+
     async def connect(self):
+        started = time.perf_counter()
         self.user = None
+        self.rooms = {}
+        self.room_groups = []
+        # room id -> ids of replayed messages; live copies of those are dropped.
+        self.replayed = {}
+        self.recent_keys = OrderedDict()
+        # room id -> unread count entry, for sockets that push unread counts.
+        self.unread = {}
+        self.outbox = self.outbox_task = None
+        self.left_groups = False
+        self.bucket = TokenBucket(
+            getattr(settings, "CHAT_RATE_LIMIT", 10),
+            getattr(settings, "CHAT_RATE_BURST", 40),
+        )
         user_token = self.scope["url_route"]["kwargs"]["token"]
         self.user = await self.get_user(user_token)
-        room_group_names = await self.get_group_names()
-        for group_name in room_group_names:
-            await self.channel_layer.group_add(group_name, self.channel_name)
-        await self.accept()
+        if self.user is None:
+            return
+        # course id -> chat room id, for every course this socket may chat in.
+        self.rooms = await self.get_rooms()
+        self.room_groups = [room_group_name(course_id) for course_id in self.rooms]
+        self.user_groups = self.get_user_groups()
+        await group_add_all(
+            self.channel_layer, [*self.user_groups, *self.room_groups], self.channel_name
+        )
+        await self.accept_codec()
+        self.outbox = Outbox(
+            getattr(settings, "CHAT_SEND_QUEUE_SIZE", 256),
+            getattr(settings, "CHAT_SLOW_CONSUMER_POLICY", "drop"),
+        )
+        self.outbox_task = asyncio.ensure_future(self.drain_outbox())
+        self.start_heartbeat()
+        metrics.histogram("chat.connect_seconds").observe(time.perf_counter() - started)
+        for course_id in self.rooms:
+            presence.join(course_id, self.user)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        if "since" in query:
+            await self.replay(parse_since(query["since"][0]))
 
     async def disconnect(self, close_code):
+        self.stop_heartbeat()
+        if self.outbox_task is not None:
+            self.outbox_task.cancel()
+        await self.leave_groups()
+
+    async def leave_groups(self):
+        """Leave every group and room presence; safe to call more than once."""
+        if self.left_groups:
+            return
+        self.left_groups = True
+        groups = list(self.room_groups)
         if self.user is not None:
-            room_group_names = await self.get_group_names()
-            for group_name in room_group_names:
-                await self.channel_layer.group_discard(group_name, self.channel_name)
+            groups.extend(self.user_groups)
+            for course_id in self.rooms:
+                presence.leave(course_id, self.user.id)
+        await group_discard_all(self.channel_layer, groups, self.channel_name)
+
+    def get_user_groups(self):
+        """Per-user groups the socket listens on besides the course chats."""
+        # Membership changes for this user arrive through their own group.
+        return [chat_user_group_name(self.user.id)]
+
+    def encode_frame(self, stream, payload):
+        return self.codec.dumps(payload)
+
+    async def send_frame(self, stream, payload, key=None):
+        """
+        Send one outgoing frame; `stream` says what kind of frame it is.
+        Frames with a `key` are encoded once per process and reused for
+        every socket that gets the same frame in the same encoding.
+        """
+        if key is None:
+            frame = self.encode_frame(stream, payload)
+        else:
+            frame = frames.get_or_encode(
+                (type(self), self.codec.name, stream, key),
+                lambda: self.encode_frame(stream, payload),
+            )
+        await self.push(frame)
+
+    async def push(self, frame):
+        """Queue an encoded frame behind the ones the client hasn't taken yet."""
+        if self.outbox is None:
+            await self.send_encoded(frame)
+        elif not self.outbox.offer(frame):
+            # Too far behind, and the policy is not to drop its frames.
+            await self.close(code=1013)
+
+    async def drain_outbox(self):
+        while True:
+            await self.send_encoded(await self.outbox.get())
 
-    async def receive(self, text_data):
+    async def admit(self, text_data, bytes_data=None):
+        """Size and rate checks every incoming frame has to pass."""
+        self.touch()
+        max_bytes = getattr(settings, "CHAT_MAX_MESSAGE_BYTES", 4096)
+        frame = text_data.encode() if text_data is not None else bytes_data
+        if not frame or len(frame) > max_bytes:
+            metrics.counter("chat.rejected.oversized").inc()
+            await self.send_error_message(
+                f"Frames must be at most {max_bytes} bytes.", stream="control"
+            )
+            return False
+        if not self.bucket.take():
+            metrics.counter("chat.rejected.connection_rate").inc()
+            await self.send_error_message("Too many messages, slow down.", stream="control")
+            return False
+        return True
+
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Receive a message from WebSocket, save it, and broadcast to the group.
-        Expects JSON data.
+        Expects JSON text or a frame in the negotiated encoding.
         """
-        data = json.loads(text_data)
-        course_id = data.get("course_id")
-        message = data.get("message", "")
-        room_group_name = f"chat_{course_id}"
-        message = await self.save_message(message, course_id)
+        if not await self.admit(text_data, bytes_data):
+            return
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError:
+            await self.send_error_message("Invalid message.")
+            return
+        await self.receive_chat(data)
+
+    async def receive_chat(self, data):
+        if isinstance(data, dict) and data.get("action") == "resume":
+            await self.replay(parse_since(data.get("since")))
+            return
+        if isinstance(data, dict) and data.get("action") == "typing":
+            await self.receive_typing(data)
+            return
+        if isinstance(data, dict) and data.get("action") == "read":
+            await self.receive_read(data)
+            return
+        if isinstance(data, dict) and data.get("action") in ("ping", "pong"):
+            if data["action"] == "ping":
+                await self.send_frame("control", {"action": "pong"})
+            return
+        try:
+            course_id = int(data.get("course_id"))
+        except (AttributeError, TypeError, ValueError):
+            await self.send_error_message("Invalid message.")
+            return
+        room_id = self.rooms.get(course_id)
+        if room_id is None:
+            await self.send_error_message("You are not a member of this course chat.")
+            return
+        bucket = room_bucket(
+            course_id,
+            getattr(settings, "CHAT_ROOM_RATE_LIMIT", 30),
+            getattr(settings, "CHAT_ROOM_RATE_BURST", 100),
+        )
+        if not bucket.take():
+            metrics.counter("chat.rejected.room_rate").inc()
+            await self.send_error_message("This chat is busy, try again shortly.")
+            return
+        client_key = data.get("client_key")
+        if client_key is not None and (
+            not isinstance(client_key, str) or not 0 < len(client_key) <= 64
+        ):
+            await self.send_error_message("client_key must be 1 to 64 characters.")
+            return
+        if client_key in self.recent_keys:
+            await self.send_frame("chat", self.recent_keys[client_key])
+            return
+        try:
+            message, created = await self.save_message(
+                room_id, data.get("message", ""), client_key
+            )
+        except Exception as e:
+            await self.send_error_message(e)
+            return
+        if client_key is not None:
+            self.recent_keys[client_key] = message
+            if len(self.recent_keys) > self.recent_keys_size:
+                self.recent_keys.popitem(last=False)
+        if not created:
+            # A retry of a message stored earlier: answer only the sender.
+            await self.send_frame("chat", message)
+            return
         await self.channel_layer.group_send(
-            room_group_name,
+            room_group_name(course_id),
             {"type": "chat_message", **message},
         )
 
     async def chat_message(self, event):
         # Send the message to WebSocket.
         del event["type"]
-        await self.send(text_data=json.dumps({**event}))
+        replayed = self.replayed.get(event["room"])
+        if replayed and event["id"] in replayed:
+            # Each message is broadcast once, so its id is no longer needed.
+            replayed.discard(event["id"])
+            return
+        await self.send_frame("chat", event, key=event["id"])
+
+    async def replay(self, since):
+        """
+        Send every message stored after `since[course_id]` in each of those
+        rooms, in batches of CHAT_REPLAY_BATCH_SIZE and at most
+        CHAT_REPLAY_LIMIT per room, each room ending with a replay_done frame.
+        Groups are joined before this runs, so nothing falls in between.
+        """
+        batch_size = getattr(settings, "CHAT_REPLAY_BATCH_SIZE", 100)
+        limit = getattr(settings, "CHAT_REPLAY_LIMIT", 1000)
+        if message_writer.enabled:
+            # Messages this process broadcast but has not written yet.
+            await message_writer.flush()
+        for course_id, since_id in since.items():
+            room_id = self.rooms.get(course_id)
+            if room_id is None:
+                continue
+            sent, complete = 0, False
+            while not complete and sent < limit:
+                size = min(batch_size, limit - sent)
+                messages = await self.get_messages_after(room_id, since_id, size)
+                complete = len(messages) < size
+                if messages:
+                    await self.send_frame(
+                        "chat",
+                        {"action": "replay", "course_id": course_id, "messages": messages},
+                    )
+                    sent += len(messages)
+                    since_id = messages[-1]["id"]
+                    # Ids are not committed in order, so a live message may
+                    # still arrive with an id below these: drop exactly the
+                    # replayed ones rather than everything up to a cutoff.
+                    self.replayed.setdefault(room_id, set()).update(
+                        message["id"] for message in messages
+                    )
+            await self.send_frame(
+                "chat",
+                {"action": "replay_done", "course_id": course_id, "complete": complete},
+            )
+            metrics.counter("chat.replayed_messages").inc(sent)
 
     @database_sync_to_async
-    def save_message(self, message, course_id):
+    def get_messages_after(self, room_id, since_id, size):
+        messages = (
+            ChatMessage.objects.filter(room_id=room_id, id__gt=since_id)
+            .select_related("sender")
+            .order_by("id")[:size]
+        )
+        return [message_payload(message, message.sender) for message in messages]
+
+    async def receive_typing(self, data):
+        try:
+            course_id = int(data.get("course_id"))
+        except (TypeError, ValueError):
+            course_id = None
+        if course_id not in self.rooms:
+            await self.send_error_message("You are not a member of this course chat.")
+            return
+        presence.typing(course_id, self.user)
+
+    async def receive_read(self, data):
+        """Move the read marker; the user's multiplexed sockets hear about it."""
         try:
-            chat_room, _ = ChatRoom.objects.get_or_create(course_id=course_id)
-            message = ChatMessage.objects.create(
-                room=chat_room, sender=self.user, message=message
+            course_id = int(data.get("course_id"))
+            message_id = data.get("message_id")
+            message_id = None if message_id is None else max(int(message_id), 0)
+        except (TypeError, ValueError):
+            await self.send_error_message("Invalid message.")
+            return
+        room_id = self.rooms.get(course_id)
+        if room_id is None:
+            await self.send_error_message("You are not a member of this course chat.")
+            return
+        last_read_id, unread = await database_sync_to_async(mark_read)(
+            self.user, room_id, message_id
+        )
+        await self.channel_layer.group_send(
+            chat_user_group_name(self.user.id),
+            {
+                "type": "chat.read",
+                "course_id": course_id,
+                "last_read_id": last_read_id,
+                "unread": unread,
+            },
+        )
+
+    async def chat_read(self, event):
+        """The user read a course chat, on this socket or another one."""
+        if not self.control_frames:
+            return
+        del event["type"]
+        entry = self.unread.get(self.rooms.get(event["course_id"]))
+        if entry is not None:
+            entry.update(last_read_id=event["last_read_id"], unread=event["unread"])
+            event = entry
+        await self.send_frame("chat", {"action": "unread", "rooms": [event]})
+
+    async def chat_presence(self, event):
+        # Plain chat sockets report presence but don't receive it; their
+        # clients only know message frames. MultiplexConsumer forwards it.
+        pass
+
+    async def chat_membership(self, event):
+        """Join or leave one course chat after an enrollment change."""
+        course_id = event["course_id"]
+        group_name = room_group_name(course_id)
+        if event["joined"]:
+            if course_id in self.rooms:
+                return
+            self.rooms[course_id] = event["room_id"]
+            self.room_groups.append(group_name)
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            presence.join(course_id, self.user)
+        else:
+            if self.rooms.pop(course_id, None) is None:
+                return
+            self.room_groups.remove(group_name)
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+            presence.leave(course_id, self.user.id)
+        if self.control_frames:
+            await self.send_frame(
+                "control",
+                {"action": "membership", "course_id": course_id, "joined": event["joined"]},
             )
-            return {
-                "id":message.id,
-                "message":message.message,
-                "room":message.room.id,
-                "timestamp":message.timestamp.isoformat(timespec="microseconds").replace("+00:00", "Z"),
-                "sender":{
-                    "id":message.sender.id,
-                    "name":message.sender.name
-                }
-            }
-        except Exception as e:
-            # Log or handle error as needed.
-            print("Error saving message:", e)
-            self.close()
+
+    async def save_message(self, room_id, text, client_key=None):
+        """Store a message; returns its payload and False if it was a retry."""
+        message = ChatMessage(
+            room_id=room_id, sender=self.user, message=text, client_key=client_key
+        )
+        created = True
+        if message_writer.enabled:
+            if client_key is not None:
+                existing = await self.find_sent(client_key)
+                if existing is not None:
+                    return message_payload(existing, self.user), False
+            await message_writer.submit(message)
+        else:
+            message, created = await database_sync_to_async(self.save_once)(message)
+        return message_payload(message, self.user), created
+
+    async def find_sent(self, client_key):
+        """
+        The user's message with this client_key, whether it is still waiting
+        in the write buffer or already stored; None for a new message.
+        """
+        message = message_writer.find_pending(self.user.id, client_key)
+        if message is None:
+            message = await ChatMessage.objects.filter(
+                sender=self.user, client_key=client_key
+            ).afirst()
+        # Checked again: the buffer may have been given it meanwhile.
+        return message or message_writer.find_pending(self.user.id, client_key)
+
+    def save_once(self, message, attempts=3):
+        """
+        Insert `message`; returns the stored message and whether it is new.
+        A client_key the sender already used returns the stored message. Any
+        other conflict is an id another process handed out in the same
+        millisecond (see SnowflakeGenerator), so the message gets a new one.
+        """
+        for attempt in range(attempts):
+            # A failed INSERT in autocommit leaves nothing to roll back; only
+            # a surrounding transaction needs a savepoint to survive it.
+            savepoint = transaction.atomic() if connection.in_atomic_block else nullcontext()
+            try:
+                with savepoint:
+                    message.save(force_insert=True)
+                return message, True
+            except IntegrityError:
+                if message.client_key is not None:
+                    existing = ChatMessage.objects.filter(
+                        sender=self.user, client_key=message.client_key
+                    ).first()
+                    if existing is not None:
+                        return existing, False
+                if attempt == attempts - 1:
+                    raise
+                metrics.counter("chat.id_collisions").inc()
+                message.id = snowflake_id()
 
     @database_sync_to_async
-    def get_group_names(self):
-        enrolled_courses = self.user.enrolled_courses.all().values_list(
-            "course__id", flat=True
+    def get_rooms(self):
+        course_ids = CourseAccess(self.user).member_course_ids
+        rooms = dict(
+            ChatRoom.objects.filter(course_id__in=course_ids).values_list(
+                "course_id", "id"
+            )
         )
-        created_course = self.user.courses_created.all().values_list("id", flat=True)
-        combined_course_ids = set(list(enrolled_courses) + list(created_course))
-        return [f"chat_{cid}" for cid in combined_course_ids]
+        missing = course_ids - rooms.keys()
+        if missing:
+            # Rooms are created with their course; this covers older courses.
+            ChatRoom.objects.bulk_create(
+                [ChatRoom(course_id=course_id) for course_id in missing],
+                ignore_conflicts=True,
+            )
+            rooms.update(
+                ChatRoom.objects.filter(course_id__in=missing).values_list(
+                    "course_id", "id"
+                )
+            )
+        return rooms
 
     async def get_user(self, token):
         try:
             decoded_data = TokenManager.decode_token(token)
-            user_id = decoded_data.get("user_id")
-            secret_key = decoded_data.get("secret_key")
-            user = await User.objects.aget(id=user_id)
-            if user.secret_key != secret_key:
-                raise Exception("Invalid credentials")
-            return user
+            return await aget_authenticated_user(
+                decoded_data.get("user_id"), decoded_data.get("secret_key")
+            )
         except Exception as e:
             await self.close()
 
-    async def send_error_message(self, e):
+    async def send_error_message(self, e, stream="chat"):
         errors = str(e)
         if not settings.DEBUG:
             errors = "An error occurred"
@@ -97,41 +506,157 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "data": errors,
             "action": "error",
         }
-        await self.send(json.dumps(response))
+        await self.send_frame(stream, response)
+
+
+class MultiplexConsumer(ChatConsumer):
+    """
+    Chat, notifications and control messages over a single socket.
+
+    Frames in both directions are envelopes, {"stream": ..., "payload": ...},
+    with `stream` one of `streams`. The chat and notification payloads are
+    the frames ChatConsumer and NotificationConsumer send on their own.
+    """
+
+    streams = ("chat", "notification", "presence", "control")
+    heartbeat_always = True
+    control_frames = True
+
+    def get_user_groups(self):
+        self.notification_group = notification_group_name(self.user.id)
+        return [*super().get_user_groups(), self.notification_group]
+
+    def encode_frame(self, stream, payload):
+        return self.codec.dumps({"stream": stream, "payload": payload})
 
+    async def connect(self):
+        await super().connect()
+        if self.outbox is not None:
+            await self.load_unread(self.rooms)
+
+    async def load_unread(self, course_ids):
+        """
+        Load the unread counts of some course chats, to keep up to date from
+        here on. Clients get the starting counts from the unread endpoint.
+        """
+        rooms = await database_sync_to_async(unread_counts)(self.user, list(course_ids))
+        for room in rooms:
+            self.unread[room["room_id"]] = room
+
+    async def chat_message(self, event):
+        room_id, message_id = event["room"], event["id"]
+        sender_id = event["sender"]["id"]
+        await super().chat_message(event)
+        entry = self.unread.get(room_id)
+        if entry is None or message_id <= entry["latest_id"]:
+            return  # already counted when the counts were loaded
+        entry["latest_id"] = message_id
+        if sender_id != self.user.id and message_id > entry["last_read_id"]:
+            entry["unread"] += 1
+            await self.send_frame("chat", {"action": "unread", "rooms": [entry]})
+
+    async def chat_membership(self, event):
+        await super().chat_membership(event)
+        if event["joined"]:
+            if event["room_id"] not in self.unread:
+                await self.load_unread([event["course_id"]])
+        else:
+            self.unread = {
+                room_id: entry
+                for room_id, entry in self.unread.items()
+                if entry["course_id"] != event["course_id"]
+            }
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not await self.admit(text_data, bytes_data):
+            return
+        try:
+            frame = self.decode_frame(text_data, bytes_data)
+            stream, payload = frame["stream"], frame.get("payload") or {}
+        except (AttributeError, KeyError, TypeError, ValueError):
+            await self.send_error_message("Invalid frame.", stream="control")
+            return
+        handler = getattr(self, f"receive_{stream}", None)
+        if stream not in self.streams or handler is None:
+            await self.send_error_message(f"Unsupported stream {stream!r}.", stream="control")
+            return
+        await handler(payload)
+
+    async def receive_notification(self, payload):
+        await self.channel_layer.group_send(
+            self.notification_group,
+            {"type": "notification_message", "message": payload.get("message", "")},
+        )
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+    async def receive_presence(self, payload):
+        if payload.get("action") == "typing":
+            await self.receive_typing(payload)
+        else:
+            await self.send_error_message("Unknown presence action.", stream="presence")
+
+    async def chat_presence(self, event):
+        del event["type"]
+        await self.send_frame("presence", event)
+
+    async def receive_control(self, payload):
+        if payload.get("action") == "ping":
+            await self.send_frame("control", {"action": "pong"})
+        elif payload.get("action") == "pong":
+            pass  # admit() already noted the socket is alive
+        else:
+            await self.send_error_message("Unknown control action.", stream="control")
+
+    async def notification_message(self, event):
+        del event["type"]
+        await self.send_frame("notification", event)
+
+
+class NotificationConsumer(CodecMixin, HeartbeatMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = None
         user_token = self.scope["url_route"]["kwargs"]["token"]
         self.user = await self.get_user(user_token)
-        self.my_group_name = f"user_{self.user.id}"
+        if self.user is None:
+            return
+        self.my_group_name = notification_group_name(self.user.id)
         await self.channel_layer.group_add(self.my_group_name, self.channel_name)
-        self.accept()
+        await self.accept_codec()
+        self.start_heartbeat()
 
-    async def receive(self, text_data=None):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        self.touch()
+        data = self.decode_frame(text_data, bytes_data)
+        if data.get("action") in ("ping", "pong"):
+            if data["action"] == "ping":
+                await self.send_frame("control", {"action": "pong"})
+            return
         message = data.get("message", "")
         await self.channel_layer.group_send(
-            self.my_group_name, {"type": "chat_message", "message": message}
+            self.my_group_name, {"type": "notification_message", "message": message}
         )
 
     async def disconnect(self, code):
+        self.stop_heartbeat()
+        await self.leave_groups()
         return await super().disconnect(code)
 
+    async def leave_groups(self):
+        if self.user is not None:
+            await self.channel_layer.group_discard(self.my_group_name, self.channel_name)
+
+    async def send_frame(self, stream, payload):
+        await self.send_encoded(self.codec.dumps(payload))
+
     async def get_user(self, token):
         try:
             decoded_data = TokenManager.decode_token(token)
-            user_id = decoded_data.get("user_id")
-            secret_key = decoded_data.get("secret_key")
-            user = await User.objects.aget(id=user_id)
-            if user.secret_key != secret_key:
-                raise Exception("Invalid credentials")
-            return user
+            return await aget_authenticated_user(
+                decoded_data.get("user_id"), decoded_data.get("secret_key")
+            )
         except Exception as e:
             await self.close()
 
-    async def chat_message(self, event):
+    async def notification_message(self, event):
         # Send the message to WebSocket.
         del event["type"]
-        await self.send(text_data=json.dumps({**event}))
+        await self.send_frame("notification", event)
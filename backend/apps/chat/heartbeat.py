@@ -0,0 +1,131 @@
+"""
+Application-level heartbeats for WebSocket consumers.
+
+Every open socket is registered with the process-wide `registry`. Any frame
+from the client counts as a sign of life. Sockets using the heartbeat get a
+ping frame once they have been quiet for WS_HEARTBEAT_INTERVAL seconds and
+are reaped after WS_IDLE_TIMEOUT: they leave their groups right away and
+are then closed, instead of waiting for TCP to notice a dead peer. One
+sweep task per process does this for all sockets.
+
+The multiplexed socket always uses the heartbeat. The older chat and
+notification sockets use it only when opened with ?heartbeat=1, since
+their existing clients don't answer pings.
+"""
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+from django.conf import settings
+from apps.base import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionRegistry:
+    def __init__(self, interval=None, idle_timeout=None):
+        self._interval = interval
+        self._idle_timeout = idle_timeout
+        # consumer -> [last seen, heartbeat enabled]
+        self._connections = {}
+        self._task = None
+
+    @property
+    def interval(self):
+        if self._interval is None:
+            return getattr(settings, "WS_HEARTBEAT_INTERVAL", 25)
+        return self._interval
+
+    @property
+    def idle_timeout(self):
+        if self._idle_timeout is None:
+            return getattr(settings, "WS_IDLE_TIMEOUT", 75)
+        return self._idle_timeout
+
+    def __len__(self):
+        return len(self._connections)
+
+    def register(self, consumer, heartbeat):
+        self._connections[consumer] = [time.monotonic(), heartbeat]
+        metrics.gauge("ws.connections.active").set(len(self._connections))
+        if heartbeat:
+            self._ensure_sweeper()
+
+    def unregister(self, consumer):
+        if self._connections.pop(consumer, None) is not None:
+            metrics.gauge("ws.connections.active").set(len(self._connections))
+
+    def seen(self, consumer):
+        entry = self._connections.get(consumer)
+        if entry is not None:
+            entry[0] = time.monotonic()
+
+    async def sweep(self, now=None):
+        """Ping quiet sockets and reap idle ones; returns how many were reaped."""
+        now = now or time.monotonic()
+        reaped = 0
+        for consumer, (last_seen, heartbeat) in list(self._connections.items()):
+            if not heartbeat:
+                continue
+            idle = now - last_seen
+            try:
+                if idle >= self.idle_timeout:
+                    self.unregister(consumer)
+                    await consumer.reap()
+                    reaped += 1
+                elif idle >= self.interval:
+                    await consumer.send_ping()
+            except Exception:
+                logger.exception("Heartbeat failed for %s", consumer.channel_name)
+        if reaped:
+            metrics.counter("ws.connections.reaped").inc(reaped)
+        return reaped
+
+    def _ensure_sweeper(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done():
+            if self._task.get_loop() is loop:
+                return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while self._connections:
+            await asyncio.sleep(max(self.interval / 2, 1))
+            await self.sweep()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+registry = ConnectionRegistry()
+
+
+class HeartbeatMixin:
+    """
+    Registers the consumer with `registry` once accepted. Consumers call
+    `touch()` for every frame received and `stop_heartbeat()` on disconnect,
+    and provide `send_frame(stream, payload)` and `leave_groups()`.
+    """
+
+    heartbeat_always = False
+    idle_close_code = 4000
+
+    def start_heartbeat(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        heartbeat = self.heartbeat_always or query.get("heartbeat") == ["1"]
+        registry.register(self, heartbeat)
+
+    def stop_heartbeat(self):
+        registry.unregister(self)
+
+    def touch(self):
+        registry.seen(self)
+
+    async def send_ping(self):
+        await self.send_frame("control", {"action": "ping"})
+
+    async def reap(self):
+        await self.leave_groups()
+        await self.close(code=self.idle_close_code)
@@ -0,0 +1,487 @@
+"""
+A channel layer shared by every process on one host through a SQLite file.
+
+Messages and group memberships live in a WAL-mode SQLite database outside
+the application database, so several daphne workers can exchange group
+messages without Redis. Each process reads its own process-specific
+channels ("<prefix>.<process>!<id>") with a single poller that backs off
+from `poll_interval` to `max_poll_interval` while idle, so idle delivery
+latency is bounded by `max_poll_interval`.
+
+Configure it with
+
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "apps.chat.layers.SQLiteChannelLayer",
+            "CONFIG": {"location": "/run/pulikidz/channels.sqlite3"},
+        }
+    }
+
+Messages expire after `expiry` seconds, group memberships after
+`group_expiry`, and a channel holding `capacity` unread messages refuses
+more: send() raises ChannelFull, and group_send() skips that member.
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+from django.utils.module_loading import import_string
+from apps.base import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    inbox TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_inbox ON channel_messages (inbox, id);
+CREATE INDEX IF NOT EXISTS channel_messages_channel ON channel_messages (channel, expires);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        location=None,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        poll_interval=0.002,
+        max_poll_interval=0.05,
+        cleanup_interval=5,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.location = str(location or settings.BASE_DIR / ".channels.sqlite3")
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.cleanup_interval = cleanup_interval
+        self.client_prefix = uuid.uuid4().hex
+        # All SQLite work happens on this one thread, with its own connection.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="sqlite-channel-layer")
+        self._connection = None
+        self._cleaned_at = 0
+        self._queues = {}
+        self._poller = None
+
+    # SQLite access, always on the layer's thread
+
+    def _db(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.location, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    def _transaction(self, function, *args):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = function(db, *args)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def _send(self, db, channel, body, now):
+        return self._group_send(db, None, body, now, [channel])
+
+    def _group_send(self, db, group, body, now, channels=None):
+        if channels is None:
+            channels = [
+                row[0]
+                for row in db.execute(
+                    "SELECT channel FROM channel_groups WHERE grp = ? AND expires > ?",
+                    (group, now),
+                )
+            ]
+        if not channels:
+            return 0
+        placeholders = ", ".join("?" * len(channels))
+        queued = dict(
+            db.execute(
+                f"SELECT channel, COUNT(*) FROM channel_messages "
+                f"WHERE channel IN ({placeholders}) AND expires > ? GROUP BY channel",
+                [*channels, now],
+            )
+        )
+        rows = [
+            (self.non_local_name(channel), channel, now + self.expiry, body)
+            for channel in channels
+            if queued.get(channel, 0) < self.get_capacity(channel)
+        ]
+        db.executemany(
+            "INSERT INTO channel_messages (inbox, channel, expires, body) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        return len(rows)
+
+    def _fetch(self, db, inboxes, now):
+        placeholders = ", ".join("?" * len(inboxes))
+        rows = db.execute(
+            f"SELECT id, channel, expires, body FROM channel_messages "
+            f"WHERE inbox IN ({placeholders}) ORDER BY id",
+            inboxes,
+        ).fetchall()
+        if rows:
+            db.execute(
+                f"DELETE FROM channel_messages WHERE inbox IN ({placeholders}) AND id <= ?",
+                [*inboxes, rows[-1][0]],
+            )
+        if now - self._cleaned_at >= self.cleanup_interval:
+            self._cleaned_at = now
+            db.execute("DELETE FROM channel_messages WHERE expires <= ?", (now,))
+            db.execute("DELETE FROM channel_groups WHERE expires <= ?", (now,))
+        return [(channel, body) for _, channel, expires, body in rows if expires > now]
+
+    def _group_add(self, db, groups, channel, now):
+        db.executemany(
+            "INSERT OR REPLACE INTO channel_groups (grp, channel, expires) VALUES (?, ?, ?)",
+            [(group, channel, now + self.group_expiry) for group in groups],
+        )
+
+    def _group_discard(self, db, groups, channel):
+        db.executemany(
+            "DELETE FROM channel_groups WHERE grp = ? AND channel = ?",
+            [(group, channel) for group in groups],
+        )
+
+    def _flush(self, db):
+        db.execute("DELETE FROM channel_messages")
+        db.execute("DELETE FROM channel_groups")
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+        body = msgpack.packb(message, use_bin_type=True)
+        sent = await self._run(self._transaction, self._send, channel, body, time.time())
+        if not sent:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = asyncio.Queue()
+        self._ensure_poller()
+        try:
+            return await queue.get()
+        except asyncio.CancelledError:
+            # The consumer is gone; stop collecting messages for it.
+            if queue.empty():
+                self._queues.pop(channel, None)
+            raise
+
+    async def new_channel(self, prefix="specific"):
+        return f"{prefix}.{self.client_prefix}!{uuid.uuid4().hex}"
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is not None and not self._poller.done():
+            if self._poller.get_loop() is loop:
+                return
+        self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        interval = self.poll_interval
+        while self._queues:
+            inboxes = sorted({self.non_local_name(channel) for channel in self._queues})
+            try:
+                rows = await self._run(self._transaction, self._fetch, inboxes, time.time())
+            except sqlite3.Error:
+                logger.exception("Could not read from the channel layer")
+                rows = []
+            for channel, body in rows:
+                queue = self._queues.get(channel)
+                if queue is not None:
+                    queue.put_nowait(msgpack.unpackb(body, raw=False))
+            if rows:
+                interval = self.poll_interval
+            else:
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+    async def flush(self):
+        await self._run(self._transaction, self._flush)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        await self.group_add_many([group], channel)
+
+    async def group_discard(self, group, channel):
+        await self.group_discard_many([group], channel)
+
+    async def group_add_many(self, groups, channel):
+        assert all(self.valid_group_name(group) for group in groups), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._run(self._transaction, self._group_add, groups, channel, time.time())
+
+    async def group_discard_many(self, groups, channel):
+        assert all(self.valid_group_name(group) for group in groups), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._run(self._transaction, self._group_discard, groups, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Group name not valid"
+        body = msgpack.packb(message, use_bin_type=True)
+        await self._run(self._transaction, self._group_send, group, body, time.time())
+
+
+class ShardedChannelLayer(BaseChannelLayer):
+    """
+    Spreads groups over several channel layers by consistent hashing, so busy
+    and quiet course chats stop sharing one broker:
+
+        CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "apps.chat.layers.ShardedChannelLayer",
+                "CONFIG": {
+                    "shards": [
+                        {"BACKEND": "channels_redis.core.RedisChannelLayer",
+                         "CONFIG": {"hosts": ["redis://chat-1:6379"]}},
+                        {"BACKEND": "channels_redis.core.RedisChannelLayer",
+                         "CONFIG": {"hosts": ["redis://chat-2:6379"]}},
+                    ],
+                },
+            }
+        }
+
+    A group lives on one shard and a direct send goes to the shard its
+    channel name hashes to, so each channel is read from every shard. Shards
+    are placed on the ring by their "NAME" (their position by default), so
+    appending a shard only moves the groups that land on it; `reshard()` moves
+    the memberships this process holds when the shard list changes at runtime.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, shards, replicas=64, **kwargs):
+        super().__init__(**kwargs)
+        self.replicas = replicas
+        self.client_prefix = uuid.uuid4().hex
+        # group -> channels of this process that joined it
+        self._members = {}
+        # channel -> (merged queue, shard name -> reader task)
+        self._readers = {}
+        self._set_shards(shards)
+
+    def _set_shards(self, shards, kept=None):
+        kept = kept or {}
+        self.names = [str(shard.get("NAME", index)) for index, shard in enumerate(shards)]
+        self.shards = [
+            kept.get(name) or self._make_shard(shard)
+            for name, shard in zip(self.names, shards)
+        ]
+        self._ring = sorted(
+            (self._hash(f"{name}#{replica}"), index)
+            for index, name in enumerate(self.names)
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    def _make_shard(self, shard):
+        layer = import_string(shard["BACKEND"])(**shard.get("CONFIG", {}))
+        if hasattr(layer, "client_prefix"):
+            # Shards must accept this process's channel names as their own.
+            layer.client_prefix = self.client_prefix
+        return layer
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def shard_index(self, name):
+        """Position in `shards` of the shard owning a group or channel name."""
+        position = bisect.bisect(self._points, self._hash(name)) % len(self._ring)
+        return self._ring[position][1]
+
+    def _metric(self, index, name):
+        return f"channels.shard.{self.names[index]}.{name}"
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific"):
+        return f"{prefix}.{self.client_prefix}!{uuid.uuid4().hex}"
+
+    async def send(self, channel, message):
+        index = self.shard_index(channel)
+        await self.shards[index].send(channel, message)
+        metrics.counter(self._metric(index, "sends")).inc()
+
+    async def receive(self, channel):
+        reader = self._readers.get(channel)
+        if reader is None:
+            queue = asyncio.Queue()
+            tasks = {
+                name: asyncio.create_task(self._read(shard, channel, queue))
+                for name, shard in zip(self.names, self.shards)
+            }
+            reader = self._readers[channel] = (queue, tasks)
+        queue, tasks = reader
+        try:
+            return await queue.get()
+        except asyncio.CancelledError:
+            # The consumer is gone; stop reading its channel from the shards.
+            for task in tasks.values():
+                task.cancel()
+            self._readers.pop(channel, None)
+            raise
+
+    async def _read(self, shard, channel, queue):
+        while True:
+            queue.put_nowait(await shard.receive(channel))
+
+    async def flush(self):
+        self._members.clear()
+        await asyncio.gather(*(shard.flush() for shard in self.shards))
+
+    async def close(self):
+        for _, tasks in self._readers.values():
+            for task in tasks.values():
+                task.cancel()
+        self._readers.clear()
+        for shard in self.shards:
+            await self._close(shard)
+
+    @staticmethod
+    async def _close(shard):
+        close = getattr(shard, "close", None) or getattr(shard, "close_pools", None)
+        if close is not None:
+            await close()
+
+    # Groups extension
+
+    def _by_shard(self, groups):
+        placement = {}
+        for group in groups:
+            placement.setdefault(self.shard_index(group), []).append(group)
+        return placement
+
+    async def _add(self, shard, groups, channel):
+        add_many = getattr(shard, "group_add_many", None)
+        if add_many is not None:
+            await add_many(groups, channel)
+        else:
+            await asyncio.gather(*(shard.group_add(group, channel) for group in groups))
+
+    async def _discard(self, shard, groups, channel):
+        discard_many = getattr(shard, "group_discard_many", None)
+        if discard_many is not None:
+            await discard_many(groups, channel)
+        else:
+            await asyncio.gather(
+                *(shard.group_discard(group, channel) for group in groups)
+            )
+
+    async def group_add(self, group, channel):
+        await self.group_add_many([group], channel)
+
+    async def group_discard(self, group, channel):
+        await self.group_discard_many([group], channel)
+
+    async def group_add_many(self, groups, channel):
+        for group in groups:
+            self._members.setdefault(group, set()).add(channel)
+        await asyncio.gather(
+            *(
+                self._add(self.shards[index], shard_groups, channel)
+                for index, shard_groups in self._by_shard(groups).items()
+            )
+        )
+
+    async def group_discard_many(self, groups, channel):
+        for group in groups:
+            members = self._members.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del self._members[group]
+        await asyncio.gather(
+            *(
+                self._discard(self.shards[index], shard_groups, channel)
+                for index, shard_groups in self._by_shard(groups).items()
+            )
+        )
+
+    async def group_send(self, group, message):
+        index = self.shard_index(group)
+        started = time.perf_counter()
+        await self.shards[index].group_send(group, message)
+        metrics.histogram(self._metric(index, "group_send_seconds")).observe(
+            time.perf_counter() - started
+        )
+        metrics.counter(self._metric(index, "group_sends")).inc()
+
+    async def reshard(self, shards):
+        """
+        Switch to a new shard list, moving the group memberships held by
+        this process onto the shards that now own them; returns how many
+        memberships moved.
+        """
+        old_shards = dict(zip(self.names, self.shards))
+        old_owners = {group: self.shards[self.shard_index(group)] for group in self._members}
+        # Shards that are kept, by name, stay the same layer instances.
+        self._set_shards(shards, kept=old_shards)
+
+        moved = 0
+        for group, channels in self._members.items():
+            old = old_owners[group]
+            new = self.shards[self.shard_index(group)]
+            if new is old:
+                continue
+            for channel in channels:
+                await self._add(new, [group], channel)
+                await self._discard(old, [group], channel)
+                moved += 1
+        # Read open channels from the added shards and stop reading the removed ones.
+        for channel, (queue, tasks) in self._readers.items():
+            for name in set(tasks) - set(self.names):
+                tasks.pop(name).cancel()
+            for name, shard in zip(self.names, self.shards):
+                if name not in tasks:
+                    tasks[name] = asyncio.create_task(self._read(shard, channel, queue))
+        for name, shard in old_shards.items():
+            if name not in self.names:
+                await self._close(shard)
+        metrics.counter("channels.shard.moved").inc(moved)
+        return moved
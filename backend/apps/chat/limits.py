@@ -0,0 +1,77 @@
+"""
+Flow control for chat sockets: token buckets for what clients send and a
+bounded outbox for what the server sends them.
+"""
+import asyncio
+import time
+from collections import deque
+from apps.base import metrics
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average and bursts of `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    def take(self, tokens=1):
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+
+_room_buckets = {}
+
+
+def room_bucket(course_id, rate, burst):
+    """The process-wide bucket of a course chat."""
+    bucket = _room_buckets.get(course_id)
+    if bucket is None or (bucket.rate, bucket.burst) != (rate, burst):
+        bucket = _room_buckets[course_id] = TokenBucket(rate, burst)
+    return bucket
+
+
+class Outbox:
+    """
+    Frames waiting to be written to one socket, at most `size` of them.
+
+    When a slow client lets it fill up, the "drop" policy discards the
+    oldest frame (clients can resume from their last message id) and the
+    "disconnect" policy tells the caller to close the socket.
+    """
+
+    def __init__(self, size, policy="drop"):
+        self.size = size
+        self.policy = policy
+        self._frames = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def offer(self, frame):
+        """Queue `frame`; returns False if the socket should be closed instead."""
+        if len(self._frames) >= self.size:
+            if self.policy == "disconnect":
+                metrics.counter("chat.outbox.disconnects").inc()
+                return False
+            self._frames.popleft()
+            metrics.counter("chat.outbox.dropped").inc()
+        self._frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def get(self):
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._frames.popleft()
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils.module_loading import import_string
+from apps.base.metrics import Histogram
+
+LAYERS = {
+    "memory": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+    "sqlite": {"BACKEND": "apps.chat.layers.SQLiteChannelLayer"},
+    "redis": {
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {"hosts": ["redis://localhost:6379/2"]},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure group_send fan-out latency and throughput of the channel "
+        "layer backends. Receivers run in this process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--layers", default="memory,sqlite,redis")
+        parser.add_argument("--receivers", type=int, default=50)
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON."
+        )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["layers"].split(",") if name.strip()]
+        unknown = set(names) - set(LAYERS)
+        if unknown:
+            raise CommandError(f"Unknown layers: {', '.join(sorted(unknown))}")
+        results = {}
+        for name in names:
+            with tempfile.TemporaryDirectory() as directory:
+                layer = self.make_layer(name, directory, options["messages"])
+                results[name] = asyncio.run(
+                    self.run(layer, options["receivers"], options["messages"])
+                )
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            if "error" in result:
+                self.stdout.write(f"{name:>8}: unavailable ({result['error']})")
+                continue
+            self.stdout.write(
+                f"{name:>8}: p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+                f"p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms, "
+                f"{result['deliveries_per_second']:.0f} deliveries/s"
+            )
+
+    def make_layer(self, name, directory, messages):
+        backend = LAYERS[name]
+        config = {**backend.get("CONFIG", {}), "capacity": messages + 1}
+        if name == "sqlite":
+            config["location"] = str(Path(directory) / "channels.sqlite3")
+        elif name == "redis" and settings.CHANNEL_LAYER == "redis":
+            config.update(settings.CHANNEL_LAYERS["default"]["CONFIG"])
+        return import_string(backend["BACKEND"])(**config)
+
+    async def run(self, layer, receivers, messages):
+        group = "benchmark"
+        try:
+            channels = [await layer.new_channel() for _ in range(receivers)]
+            for channel in channels:
+                await asyncio.wait_for(layer.group_add(group, channel), 5)
+        except Exception as e:
+            return {"error": str(e) or type(e).__name__}
+
+        latencies = Histogram("benchmark", size=receivers * messages)
+        latest = 0.0
+
+        async def receive(channel):
+            nonlocal latest
+            for _ in range(messages):
+                message = await layer.receive(channel)
+                now = time.perf_counter()
+                latencies.observe(now - message["sent"])
+                latest = max(latest, now)
+
+        tasks = [asyncio.create_task(receive(channel)) for channel in channels]
+        # Let every receiver start listening before the clock starts.
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        for _ in range(messages):
+            await layer.group_send(group, {"type": "benchmark", "sent": time.perf_counter()})
+        try:
+            await asyncio.wait_for(asyncio.gather(*tasks), 60)
+        except asyncio.TimeoutError:
+            return {"error": f"only {latencies.count} of {receivers * messages} delivered"}
+        finally:
+            await layer.flush()
+            close = getattr(layer, "close", None) or getattr(layer, "close_pools", None)
+            if close is not None:
+                await close()
+        samples = sorted(latencies.samples)
+        return {
+            "receivers": receivers,
+            "messages": messages,
+            "p50_ms": latencies.percentile(0.50) * 1000,
+            "p95_ms": latencies.percentile(0.95) * 1000,
+            "p99_ms": latencies.percentile(0.99) * 1000,
+            "max_ms": samples[-1] * 1000,
+            "deliveries_per_second": latencies.count / (latest - started),
+        }
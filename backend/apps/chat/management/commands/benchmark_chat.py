@@ -0,0 +1,219 @@
+import asyncio
+import json
+import resource
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from apps.base.metrics import Histogram
+from apps.courses.models import Course, CourseEnrollment
+from apps.users.models import User
+from backend.custom_authentication import TokenManager
+
+
+def summary(histogram):
+    samples = sorted(histogram.samples)
+    if not samples:
+        return {"count": 0}
+    milliseconds = lambda value: round(value * 1000, 3)  # noqa: E731
+    return {
+        "count": histogram.count,
+        "mean_ms": milliseconds(histogram.total / histogram.count),
+        "p50_ms": milliseconds(histogram.percentile(0.50)),
+        "p95_ms": milliseconds(histogram.percentile(0.95)),
+        "p99_ms": milliseconds(histogram.percentile(0.99)),
+        "max_ms": milliseconds(samples[-1]),
+    }
+
+
+def rss_kb():
+    # Linux reports the peak resident set size in kilobytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the chat socket in process: open many authenticated "
+        "connections to the ASGI application over synthetic courses in a "
+        "throwaway test database, then measure connect time, fan-out latency, "
+        "throughput and memory per connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--courses", type=int, default=20)
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument(
+            "--rate", type=float, default=100, help="Messages sent per second, 0 for no limit."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=100, help="Connections opened at once."
+        )
+        parser.add_argument("--timeout", type=float, default=60)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if options["courses"] < 1 or options["connections"] < options["courses"]:
+            raise CommandError("Need at least one course and one connection per course.")
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            rooms = self.seed(options["connections"], options["courses"])
+            # Flood limits would only measure themselves.
+            with override_settings(
+                CHAT_RATE_LIMIT=1e9, CHAT_ROOM_RATE_LIMIT=1e9,
+                CHAT_RATE_BURST=1e9, CHAT_ROOM_RATE_BURST=1e9,
+            ):
+                report = asyncio.run(self.run(rooms, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "options": {
+                key: options[key]
+                for key in ("connections", "courses", "messages", "rate", "concurrency")
+            },
+            "channel_layer": settings.CHANNEL_LAYERS["default"]["BACKEND"],
+            "persistence": getattr(settings, "CHAT_PERSISTENCE", "immediate"),
+            **report,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def seed(self, connections, courses):
+        """Create the users and courses; returns course id -> user ids."""
+        users = []
+        for index in range(connections):
+            user = User(email=f"bench{index}@example.com", name=f"Bench {index}")
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users)
+        instructors, students = users[:courses], users[courses:]
+        # Created one by one so each course gets its chat room.
+        rooms = {}
+        for index, instructor in enumerate(instructors):
+            course = Course.objects.create(title=f"Benchmark {index}", instructor=instructor)
+            rooms[course.id] = [instructor]
+        course_ids = list(rooms)
+        for index, student in enumerate(students):
+            rooms[course_ids[index % courses]].append(student)
+        CourseEnrollment.objects.bulk_create(
+            [
+                CourseEnrollment(course_id=course_id, student=student)
+                for course_id, members in rooms.items()
+                for student in members[1:]
+            ]
+        )
+        return rooms
+
+    async def run(self, rooms, options):
+        from channels.testing import WebsocketCommunicator
+        from backend.asgi import application
+
+        connect_times = Histogram("connect", size=options["connections"])
+        failed = 0
+        sockets = {course_id: [] for course_id in rooms}
+        members = [(course_id, user) for course_id, users in rooms.items() for user in users]
+
+        async def open_socket(course_id, user):
+            nonlocal failed
+            token = TokenManager.get_token({"user_id": user.id, "secret_key": user.secret_key})
+            communicator = WebsocketCommunicator(application, f"/ws/chat/{token}/")
+            started = time.perf_counter()
+            connected, _ = await communicator.connect(timeout=options["timeout"])
+            if not connected:
+                failed += 1
+                return
+            connect_times.observe(time.perf_counter() - started)
+            sockets[course_id].append(communicator)
+
+        rss_before = rss_kb()
+        for start in range(0, len(members), options["concurrency"]):
+            await asyncio.gather(
+                *(open_socket(*member) for member in members[start:start + options["concurrency"]])
+            )
+        opened = sum(len(communicators) for communicators in sockets.values())
+        rss_growth = rss_kb() - rss_before
+
+        latencies = Histogram("fanout", size=max(opened * options["messages"], 1))
+        sent_at = {}
+        expected = 0
+        all_sent = False
+        # Set once every message is sent and every copy of it has arrived.
+        delivered = asyncio.Event()
+
+        async def read(communicator):
+            while True:
+                frame = json.loads(await communicator.receive_from(timeout=options["timeout"]))
+                sent = sent_at.get(frame.get("message"))
+                if sent is not None:
+                    latencies.observe(time.perf_counter() - sent)
+                    if all_sent and latencies.count >= expected:
+                        delivered.set()
+
+        readers = [
+            asyncio.create_task(read(communicator))
+            for communicators in sockets.values()
+            for communicator in communicators
+        ]
+        rooms_with_sockets = [course_id for course_id, s in sockets.items() if s]
+        started = time.perf_counter()
+        for index in range(options["messages"]):
+            course_id = rooms_with_sockets[index % len(rooms_with_sockets)]
+            communicators = sockets[course_id]
+            text = f"benchmark {index}"
+            expected += len(communicators)
+            sent_at[text] = time.perf_counter()
+            await communicators[index % len(communicators)].send_json_to(
+                {"course_id": course_id, "message": text}
+            )
+            if options["rate"]:
+                await asyncio.sleep(max(0, started + (index + 1) / options["rate"] - time.perf_counter()))
+        sent_seconds = time.perf_counter() - started
+        all_sent = True
+        if latencies.count >= expected:
+            delivered.set()
+        try:
+            await asyncio.wait_for(delivered.wait(), options["timeout"])
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        undelivered = max(expected - latencies.count, 0)
+        if undelivered:
+            self.stderr.write(
+                f"{undelivered} of {expected} message copies were not delivered "
+                f"within {options['timeout']}s."
+            )
+
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for communicators in sockets.values():
+            for communicator in communicators:
+                await communicator.disconnect()
+
+        return {
+            "connect": {**summary(connect_times), "failed": failed},
+            "fanout": {
+                **summary(latencies),
+                "expected": expected,
+                "undelivered": undelivered,
+            },
+            "throughput": {
+                "sent_per_second": round(options["messages"] / sent_seconds, 1),
+                "delivered_per_second": round(latencies.count / elapsed, 1),
+            },
+            "memory": {
+                "rss_growth_kb": rss_growth,
+                "rss_per_connection_kb": round(rss_growth / opened, 2) if opened else None,
+            },
+        }
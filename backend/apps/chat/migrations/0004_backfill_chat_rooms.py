@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_missing_rooms(apps, schema_editor):
+    Course = apps.get_model("courses", "Course")
+    ChatRoom = apps.get_model("chat", "ChatRoom")
+    missing = Course.objects.filter(chat_room__isnull=True).values_list("id", flat=True)
+    ChatRoom.objects.bulk_create(
+        [ChatRoom(course_id=course_id) for course_id in missing.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chat_message_keyset_index'),
+        ('courses', '0005_enrollment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_rooms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_chat_read_marker'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='chatmessage',
+            name='chat_msg_sender_client_key_uniq',
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('sender', 'client_key'), name='chat_msg_sender_client_key_uniq'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from apps.base.utils import snowflake_id
 from apps.courses.models import Course  # adjust the import as needed
 
 User = get_user_model()
@@ -23,7 +25,11 @@ class ChatRoom(models.Model):
 class ChatMessage(models.Model):
     """
     A ChatMessage stores individual messages sent in a ChatRoom.
+
+    Ids and timestamps are assigned in Python so buffered messages can be
+    broadcast before they are written.
     """
+    id = models.BigIntegerField(primary_key=True, default=snowflake_id, editable=False)
     room = models.ForeignKey(
         ChatRoom,
         on_delete=models.CASCADE,
@@ -35,7 +41,52 @@ class ChatMessage(models.Model):
         related_name='chat_messages'
     )
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Set by the client so a retried send is stored only once.
+    client_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "timestamp", "id"], name="chat_msg_room_ts_idx"),
+            models.Index(fields=["room", "id"], name="chat_msg_room_id_idx"),
+        ]
+        constraints = [
+            # NULL keys never conflict, so messages without one are not
+            # constrained. Unconditional so writes can upsert against it.
+            models.UniqueConstraint(
+                fields=["sender", "client_key"],
+                name="chat_msg_sender_client_key_uniq",
+            ),
+        ]
 
     def __str__(self):
         return f"Message by {self.sender} in {self.room} at {self.timestamp:%Y-%m-%d %H:%M:%S}"
+
+
+class ChatReadMarker(models.Model):
+    """
+    The newest message a user has read in a ChatRoom. Message ids grow over
+    time, so everything in the room after `last_read_id` is unread.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chat_read_markers'
+    )
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_markers'
+    )
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "room"], name="chat_read_marker_user_room_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} read {self.room} up to {self.last_read_id}"
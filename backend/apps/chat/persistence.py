@@ -0,0 +1,236 @@
+"""
+Write-behind persistence for chat messages.
+
+With CHAT_PERSISTENCE = "buffered" the consumer hands messages, with their
+id and timestamp already assigned, to `writer` and broadcasts them right
+away. A background task on the event loop writes the buffer with one
+bulk_create every CHAT_BUFFER_FLUSH_INTERVAL_MS milliseconds, or as soon as
+CHAT_BUFFER_BATCH_SIZE messages are waiting, and the rest is written when
+the process exits. A batch the database refuses is written again one message
+at a time: messages it still refuses are dropped and logged as dead letters,
+and those that failed because the database was unreachable are retried.
+
+The ids come from SNOWFLAKE_WORKER_ID, which has to be unique per process
+(see `check_worker_id`); a duplicate id is an error, not a skipped row.
+
+CHAT_BUFFER_DURABLE trades latency for safety: when it is on, a sender
+waits until the batch holding its message is committed before the message
+is broadcast, so nothing anyone has seen can be lost. When it is off, a
+crash loses whatever was still buffered.
+"""
+import asyncio
+import atexit
+import logging
+import time
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import InterfaceError, OperationalError, transaction
+from apps.base import metrics
+from apps.base.utils import SnowflakeGenerator
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the message itself.
+TRANSIENT_ERRORS = (InterfaceError, OperationalError)
+
+
+def check_worker_id():
+    """
+    Buffered messages get their ids before they are written, so processes
+    sharing a worker id would hand out the same ids. Refuse to start in
+    buffered mode without one.
+    """
+    if getattr(settings, "CHAT_PERSISTENCE", "immediate") != "buffered":
+        return
+    workers = 1 << SnowflakeGenerator.WORKER_BITS
+    worker_id = getattr(settings, "SNOWFLAKE_WORKER_ID", None)
+    if worker_id is None or not str(worker_id).isdigit() or int(worker_id) >= workers:
+        raise ImproperlyConfigured(
+            "Buffered chat persistence needs SNOWFLAKE_WORKER_ID set to a number "
+            f"from 0 to {workers - 1}, unique per process (0 for a single process)."
+        )
+
+
+class MessageWriter:
+    def __init__(self, flush_interval_ms=None, batch_size=None, durable=None):
+        self._flush_interval_ms = flush_interval_ms
+        self._batch_size = batch_size
+        self._durable = durable
+        self._pending = []
+        # Batches being written, still to be found by `find_pending`.
+        self._writing = []
+        self._task = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, "CHAT_PERSISTENCE", "immediate") == "buffered"
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval_ms is None:
+            return getattr(settings, "CHAT_BUFFER_FLUSH_INTERVAL_MS", 50) / 1000
+        return self._flush_interval_ms / 1000
+
+    @property
+    def batch_size(self):
+        if self._batch_size is None:
+            return getattr(settings, "CHAT_BUFFER_BATCH_SIZE", 100)
+        return self._batch_size
+
+    @property
+    def durable(self):
+        if self._durable is None:
+            return getattr(settings, "CHAT_BUFFER_DURABLE", False)
+        return self._durable
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def find_pending(self, sender_id, client_key):
+        """The unwritten message `sender_id` sent with `client_key`, if any."""
+        for batch in [self._pending, *self._writing]:
+            for message, _ in batch:
+                if message.client_key == client_key and message.sender_id == sender_id:
+                    return message
+        return None
+
+    async def submit(self, message):
+        """
+        Queue `message` for writing. In durable mode this returns once the
+        message is committed and raises if its batch could not be written.
+        """
+        loop = asyncio.get_running_loop()
+        written = loop.create_future() if self.durable else None
+        self._pending.append((message, written))
+        metrics.gauge("chat.buffer.depth").set(len(self._pending))
+        self._ensure_flusher(loop)
+        if len(self._pending) >= self.batch_size:
+            loop.create_task(self.flush())
+        if written is not None:
+            await written
+
+    async def flush(self):
+        """Write everything queued so far; returns how many messages were written."""
+        batch, self._pending = self._pending, []
+        metrics.gauge("chat.buffer.depth").set(0)
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        self._writing.append(batch)
+        try:
+            errors = await database_sync_to_async(self._write)(
+                [message for message, _ in batch]
+            )
+        except Exception as e:
+            errors = [e] * len(batch)
+        finally:
+            self._writing.remove(batch)
+        metrics.histogram("chat.buffer.flush_seconds").observe(
+            time.perf_counter() - started
+        )
+        retry = []
+        for (message, written), error in zip(batch, errors):
+            if error is None:
+                if written is not None and not written.done():
+                    written.set_result(None)
+            elif written is not None:
+                # Durable senders learn about the failure instead.
+                if not written.done():
+                    written.set_exception(error)
+            elif isinstance(error, TRANSIENT_ERRORS):
+                retry.append((message, written))
+            else:
+                self._drop(message, error)
+        if retry:
+            logger.error("Could not write %d chat messages; retrying", len(retry))
+            metrics.counter("chat.buffer.flush_errors").inc()
+            self._pending[:0] = retry
+            metrics.gauge("chat.buffer.depth").set(len(self._pending))
+        count = errors.count(None)
+        metrics.counter("chat.buffer.written").inc(count)
+        return count
+
+    def _write(self, messages):
+        """
+        Write `messages`; returns, for each one, None or the error that kept
+        it out. A batch that fails is written again a row at a time so one
+        bad message cannot hold back the rest.
+        """
+        try:
+            self._insert(messages)
+            return [None] * len(messages)
+        except Exception as e:
+            if len(messages) == 1 or isinstance(e, TRANSIENT_ERRORS):
+                return [e] * len(messages)
+        errors = []
+        for message in messages:
+            try:
+                self._insert([message])
+            except Exception as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+        return errors
+
+    def _insert(self, messages):
+        # A retried send whose client_key the sender already stored leaves
+        # the stored row alone; any other conflict, such as a duplicate id,
+        # fails the write. Its own transaction, so a failure leaves whatever
+        # surrounds it usable for the next attempt.
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(
+                messages,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["sender", "client_key"],
+                update_fields=["client_key"],
+            )
+
+    def _drop(self, message, error):
+        metrics.counter("chat.buffer.dropped").inc()
+        logger.error(
+            "Dropped chat message %s in room %s from user %s (client_key %r): %s",
+            message.id, message.room_id, message.sender_id, message.client_key, error,
+            extra={"dead_letter": {"id": message.id, "message": message.message}},
+        )
+
+    def _ensure_flusher(self, loop):
+        if self._task is not None and not self._task.done():
+            if self._task.get_loop() is loop:
+                return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Could not flush chat messages")
+
+    async def close(self):
+        """Stop the background task and write what is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        return await self.flush()
+
+    def stop(self):
+        """Write what is still queued, from outside any event loop."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            errors = self._write([message for message, _ in batch])
+        except Exception:
+            logger.exception("Could not write chat messages on shutdown")
+            return
+        for (message, _), error in zip(batch, errors):
+            if error is not None:
+                self._drop(message, error)
+
+
+writer = MessageWriter()
+atexit.register(writer.stop)
@@ -0,0 +1,192 @@
+"""
+Who is online, and who is typing, in each course chat.
+
+Sockets report joins, leaves and typing to the process-wide `tracker`.
+Nothing is sent per event: every PRESENCE_BROADCAST_INTERVAL seconds a
+background task sends each changed room one chat.presence diff over its
+chat group and writes the room's members to the cache. The members are
+also rewritten every PRESENCE_TTL / 3 seconds as a heartbeat, so a room
+whose process died empties once PRESENCE_TTL runs out.
+
+The cache entry of a room is shared by every process serving it and is
+updated read-modify-write, so a racing update can drop a user until the
+next heartbeat puts them back.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from apps.base import metrics
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = "presence:{course_id}"
+
+
+class PresenceTracker:
+    def __init__(self, interval=None, ttl=None, typing_interval=None):
+        self._interval = interval
+        self._ttl = ttl
+        self._typing_interval = typing_interval
+        # course id -> user id -> number of open sockets in this process
+        self._sockets = defaultdict(Counter)
+        self._names = {}
+        # course id -> {"online", "offline", "typing"} user ids since the last diff
+        self._changes = {}
+        self._typing_at = {}
+        self._heartbeat_at = 0
+        self._task = None
+
+    @property
+    def interval(self):
+        if self._interval is None:
+            return getattr(settings, "PRESENCE_BROADCAST_INTERVAL", 1.0)
+        return self._interval
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return getattr(settings, "PRESENCE_TTL", 60)
+        return self._ttl
+
+    @property
+    def typing_interval(self):
+        if self._typing_interval is None:
+            return getattr(settings, "PRESENCE_TYPING_INTERVAL", 3)
+        return self._typing_interval
+
+    def _room_changes(self, course_id):
+        return self._changes.setdefault(
+            course_id, {"online": set(), "offline": set(), "typing": set()}
+        )
+
+    def join(self, course_id, user):
+        sockets = self._sockets[course_id]
+        sockets[user.id] += 1
+        self._names[user.id] = user.name
+        if sockets[user.id] == 1:
+            changes = self._room_changes(course_id)
+            changes["offline"].discard(user.id)
+            changes["online"].add(user.id)
+        self._ensure_broadcaster()
+
+    def leave(self, course_id, user_id):
+        sockets = self._sockets.get(course_id)
+        if not sockets or not sockets[user_id]:
+            return
+        sockets[user_id] -= 1
+        if sockets[user_id]:
+            return
+        del sockets[user_id]
+        if not sockets:
+            del self._sockets[course_id]
+        self._typing_at.pop((course_id, user_id), None)
+        changes = self._room_changes(course_id)
+        changes["online"].discard(user_id)
+        changes["typing"].discard(user_id)
+        changes["offline"].add(user_id)
+        if not any(user_id in room for room in self._sockets.values()):
+            self._names.pop(user_id, None)
+        self._ensure_broadcaster()
+
+    def typing(self, course_id, user):
+        """Note a keystroke; returns False if it falls inside the rate limit."""
+        if not self._sockets.get(course_id, {}).get(user.id):
+            return False
+        now = time.monotonic()
+        key = (course_id, user.id)
+        if now - self._typing_at.get(key, float("-inf")) < self.typing_interval:
+            return False
+        self._typing_at[key] = now
+        self._room_changes(course_id)["typing"].add(user.id)
+        self._ensure_broadcaster()
+        return True
+
+    def is_online(self, course_id, user_id):
+        return bool(self._sockets.get(course_id, {}).get(user_id))
+
+    async def flush(self, channel_layer=None):
+        """Broadcast and store every pending change; returns the rooms sent."""
+        from channels.layers import get_channel_layer
+        from .consumers import room_group_name
+
+        channel_layer = channel_layer or get_channel_layer()
+        changes, self._changes = self._changes, {}
+        heartbeat = time.monotonic() - self._heartbeat_at >= self.ttl / 3
+        if heartbeat:
+            self._heartbeat_at = time.monotonic()
+        rooms = set(changes) | (set(self._sockets) if heartbeat else set())
+        for course_id in rooms:
+            await self._store(course_id, changes.get(course_id, {}).get("offline", ()))
+        for course_id, change in changes.items():
+            if not any(change.values()):
+                continue
+            await channel_layer.group_send(
+                room_group_name(course_id),
+                {
+                    "type": "chat.presence",
+                    "course_id": course_id,
+                    "online": [self._member(user_id) for user_id in sorted(change["online"])],
+                    "offline": sorted(change["offline"]),
+                    "typing": [self._member(user_id) for user_id in sorted(change["typing"])],
+                },
+            )
+            metrics.counter("chat.presence.broadcasts").inc()
+        return len(changes)
+
+    def _member(self, user_id):
+        return {"id": user_id, "name": self._names.get(user_id)}
+
+    async def _store(self, course_id, removed):
+        key = PRESENCE_KEY.format(course_id=course_id)
+        now = time.time()
+        entries = await cache.aget(key) or {}
+        entries = {
+            user_id: entry
+            for user_id, entry in entries.items()
+            if entry[1] > now and user_id not in removed
+        }
+        for user_id in self._sockets.get(course_id, ()):
+            entries[user_id] = (self._names.get(user_id), now + self.ttl)
+        if entries:
+            await cache.aset(key, entries, self.ttl)
+        else:
+            await cache.adelete(key)
+
+    def snapshot(self, course_id):
+        """Everyone online in the course, across processes."""
+        entries = cache.get(PRESENCE_KEY.format(course_id=course_id)) or {}
+        now = time.time()
+        return [
+            {"id": user_id, "name": name}
+            for user_id, (name, expires_at) in sorted(entries.items())
+            if expires_at > now
+        ]
+
+    def _ensure_broadcaster(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done():
+            if self._task.get_loop() is loop:
+                return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Could not broadcast presence")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+tracker = PresenceTracker()
@@ -1,7 +1,8 @@
 from django.urls import path
-from .consumers import ChatConsumer, NotificationConsumer
+from .consumers import ChatConsumer, MultiplexConsumer, NotificationConsumer
 
 websocket_urlpatterns = [
     path('ws/chat/<str:token>/', ChatConsumer.as_asgi()),
     path('ws/chat/notification/<str:token>/', NotificationConsumer.as_asgi()),
+    path('ws/stream/<str:token>/', MultiplexConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import ChatRoom, ChatMessage
-from apps.users.serializers import ProfileSerializer
+from django.contrib.auth import get_user_model
 
 
 class ChatRoomSerializer(serializers.ModelSerializer):
@@ -9,9 +9,21 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         fields = ["id", "course", "created_at"]
 
 
+class ChatSenderSerializer(serializers.ModelSerializer):
+    """Just enough of the sender to render a message."""
+
+    class Meta:
+        model = get_user_model()
+        fields = ["id", "name", "profile_pic"]
+
+
 class ChatMessageSerializer(serializers.ModelSerializer):
-    sender = ProfileSerializer()  # Show sender's username
+    sender = ChatSenderSerializer(read_only=True)
 
     class Meta:
         model = ChatMessage
-        fields = ["id", "room", "sender", "message", "timestamp"]
\ No newline at end of file
+        fields = ["id", "room", "sender", "message", "timestamp"]
+
+
+class ChatReadSerializer(serializers.Serializer):
+    message_id = serializers.IntegerField(min_value=0, required=False)
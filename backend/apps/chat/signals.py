@@ -0,0 +1,78 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.courses.models import Course, CourseEnrollment
+from .models import ChatRoom
+
+logger = logging.getLogger(__name__)
+
+
+def chat_user_group_name(user_id):
+    # Not user_<id>: NotificationConsumer relays client messages there.
+    return f"chat_user_{user_id}"
+
+
+def notify_membership(user_id, course_id, joined):
+    """
+    Tell the user's open chat sockets to join or leave one course chat,
+    once the change that grants or revokes it is committed.
+    """
+
+    def send():
+        event = {"type": "chat.membership", "course_id": course_id, "joined": joined}
+        if joined:
+            room, _ = ChatRoom.objects.get_or_create(course_id=course_id)
+            event["room_id"] = room.id
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                chat_user_group_name(user_id), event
+            )
+        except Exception:
+            # Sockets catch up on their next connect.
+            logger.exception("Could not send chat membership to user %s", user_id)
+
+    transaction.on_commit(send)
+
+
+def notify_read(user_id, course_id, last_read_id, unread):
+    """Tell the user's open chat sockets that a course chat was read."""
+    event = {
+        "type": "chat.read",
+        "course_id": course_id,
+        "last_read_id": last_read_id,
+        "unread": unread,
+    }
+
+    def send():
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                chat_user_group_name(user_id), event
+            )
+        except Exception:
+            logger.exception("Could not send read marker to user %s", user_id)
+
+    transaction.on_commit(send)
+
+
+@receiver(post_save, sender=Course)
+def create_chat_room(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ChatRoom.objects.get_or_create(course=instance)
+        notify_membership(instance.instructor_id, instance.id, joined=True)
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def enrollment_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "is_blocked" not in update_fields):
+        return
+    if created and instance.is_blocked:
+        return
+    notify_membership(instance.student_id, instance.course_id, not instance.is_blocked)
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def enrollment_removed(sender, instance, **kwargs):
+    notify_membership(instance.student_id, instance.course_id, joined=False)
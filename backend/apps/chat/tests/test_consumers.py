@@ -0,0 +1,488 @@
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.utils import CursorWrapper
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from apps.base import metrics
+from apps.base.utils import snowflake_id
+from apps.courses.models import Course, CourseEnrollment
+from backend.custom_authentication import TokenManager
+from ..models import ChatMessage, ChatRoom
+from ..codecs import CODECS
+from ..consumers import ChatConsumer
+from ..heartbeat import registry
+from ..limits import Outbox
+from ..persistence import check_worker_id, writer
+from ..presence import tracker as presence
+from ..routing import websocket_urlpatterns
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class ChatConsumerTests(APITestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="testpassword")
+        self.student = User.objects.create_user(email="student@example.com", password="testpassword")
+        self.course = Course.objects.create(title="Test Course", instructor=self.teacher)
+        self.other_course = Course.objects.create(title="Other Course", instructor=self.teacher)
+        CourseEnrollment.objects.create(student=self.student, course=self.course)
+
+    def connect(self, user, path="/ws/chat/{token}/", query="", subprotocols=None):
+        token = TokenManager.get_token({"user_id": user.id, "secret_key": user.secret_key})
+        return WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            path.format(token=token) + query,
+            subprotocols=subprotocols,
+        )
+
+    async def test_connect_joins_every_course_group_and_disconnect_leaves(self):
+        courses = [
+            await Course.objects.acreate(title=f"Course {i}", instructor=self.teacher)
+            for i in range(5)
+        ]
+        connects = metrics.histogram("chat.connect_seconds").count
+        teacher = self.connect(self.teacher)
+        self.assertTrue((await teacher.connect())[0])
+        self.assertEqual(metrics.histogram("chat.connect_seconds").count, connects + 1)
+
+        layer = get_channel_layer()
+        for course in [self.course, self.other_course, *courses]:
+            self.assertEqual(len(layer.groups.get(f"chat_{course.id}", {})), 1)
+        await teacher.disconnect()
+        for course in [self.course, self.other_course, *courses]:
+            self.assertFalse(layer.groups.get(f"chat_{course.id}"))
+
+    async def test_enrollment_changes_update_open_sockets(self):
+        student = self.connect(self.student)
+        stream = self.connect(self.student, "/ws/stream/{token}/")
+        self.assertTrue((await student.connect())[0])
+        self.assertTrue((await stream.connect())[0])
+
+        def change(update):
+            with self.captureOnCommitCallbacks(execute=True):
+                return update()
+
+        enrollment = await sync_to_async(change)(
+            lambda: CourseEnrollment.objects.create(student=self.student, course=self.other_course)
+        )
+        event = (await stream.receive_json_from())["payload"]
+        self.assertEqual(event, {"action": "membership", "course_id": self.other_course.id, "joined": True})
+        # Plain chat sockets follow the change without being told.
+        await student.send_json_to({"course_id": self.other_course.id, "message": "Hi"})
+        self.assertEqual((await student.receive_json_from())["message"], "Hi")
+        self.assertEqual((await stream.receive_json_from())["payload"]["message"], "Hi")
+
+        enrollment.is_blocked = True
+        await sync_to_async(change)(enrollment.save)
+        self.assertFalse((await stream.receive_json_from())["payload"]["joined"])
+        await student.send_json_to({"course_id": self.other_course.id, "message": "Hi"})
+        self.assertEqual((await student.receive_json_from())["action"], "error")
+        self.assertTrue(await student.receive_nothing())
+        await student.disconnect()
+        await stream.disconnect()
+
+    async def test_multiplexed_socket_carries_every_stream(self):
+        socket = self.connect(self.student, "/ws/stream/{token}/")
+        self.assertTrue((await socket.connect())[0])
+
+        await socket.send_json_to(
+            {"stream": "chat", "payload": {"course_id": self.course.id, "message": "Hi"}}
+        )
+        frame = await socket.receive_json_from()
+        self.assertEqual(frame["stream"], "chat")
+        self.assertEqual(frame["payload"]["message"], "Hi")
+
+        await socket.send_json_to({"stream": "notification", "payload": {"message": "Ping"}})
+        self.assertEqual(
+            await socket.receive_json_from(),
+            {"stream": "notification", "payload": {"message": "Ping"}},
+        )
+
+        await socket.send_json_to({"stream": "control", "payload": {"action": "ping"}})
+        self.assertEqual(
+            await socket.receive_json_from(),
+            {"stream": "control", "payload": {"action": "pong"}},
+        )
+
+        await socket.send_json_to({"stream": "video", "payload": {}})
+        frame = await socket.receive_json_from()
+        self.assertEqual((frame["stream"], frame["payload"]["action"]), ("control", "error"))
+        await socket.disconnect()
+
+    @override_settings(CHAT_REPLAY_BATCH_SIZE=2)
+    async def test_reconnect_replays_missed_messages_in_batches(self):
+        room = await ChatRoom.objects.aget(course=self.course)
+        seen = await ChatMessage.objects.acreate(room=room, sender=self.teacher, message="seen")
+        for text in ("one", "two", "three"):
+            await ChatMessage.objects.acreate(room=room, sender=self.teacher, message=text)
+
+        student = self.connect(self.student, query=f"?since={self.course.id}:{seen.id}")
+        self.assertTrue((await student.connect())[0])
+        first = await student.receive_json_from()
+        second = await student.receive_json_from()
+        done = await student.receive_json_from()
+        self.assertEqual(first["action"], "replay")
+        self.assertEqual([m["message"] for m in first["messages"]], ["one", "two"])
+        self.assertEqual([m["message"] for m in second["messages"]], ["three"])
+        self.assertEqual(done, {"action": "replay_done", "course_id": self.course.id, "complete": True})
+
+        await student.send_json_to(
+            {"action": "resume", "since": {str(self.course.id): second["messages"][0]["id"]}}
+        )
+        self.assertEqual((await student.receive_json_from())["action"], "replay_done")
+        await student.disconnect()
+
+    async def test_live_messages_are_dropped_only_if_replayed(self):
+        room = await ChatRoom.objects.aget(course=self.course)
+        seen = await ChatMessage.objects.acreate(room=room, sender=self.teacher, message="seen")
+        await ChatMessage.objects.acreate(room=room, sender=self.teacher, message="one")
+        student = self.connect(self.student, query=f"?since={self.course.id}:{seen.id}")
+        self.assertTrue((await student.connect())[0])
+        replayed = (await student.receive_json_from())["messages"][0]
+        await student.receive_json_from()  # replay_done
+
+        # A message with an older id that committed after the replay query.
+        late = {**replayed, "id": replayed["id"] - 1, "message": "late"}
+        layer = get_channel_layer()
+        for payload in (replayed, late):
+            await layer.group_send(f"chat_{self.course.id}", {"type": "chat_message", **payload})
+        self.assertEqual((await student.receive_json_from())["message"], "late")
+        self.assertTrue(await student.receive_nothing())
+        await student.disconnect()
+
+    async def test_client_key_stores_a_retried_send_once(self):
+        teacher = self.connect(self.teacher)
+        student = self.connect(self.student)
+        self.assertTrue((await teacher.connect())[0])
+        self.assertTrue((await student.connect())[0])
+        send = {"course_id": self.course.id, "message": "Hi", "client_key": "k1"}
+
+        await student.send_json_to(send)
+        sent = await student.receive_json_from()
+        self.assertEqual((await teacher.receive_json_from())["id"], sent["id"])
+        await student.disconnect()
+
+        # The retry comes in on a new connection after a reconnect.
+        student = self.connect(self.student)
+        self.assertTrue((await student.connect())[0])
+        await student.send_json_to(send)
+        self.assertEqual((await student.receive_json_from())["id"], sent["id"])
+        self.assertTrue(await teacher.receive_nothing())
+        self.assertEqual(await ChatMessage.objects.acount(), 1)
+        await teacher.disconnect()
+        await student.disconnect()
+
+    @override_settings(PRESENCE_BROADCAST_INTERVAL=60)
+    async def test_presence_changes_are_coalesced_per_room(self):
+        await presence.flush()  # whatever earlier tests left behind
+        teacher = self.connect(self.teacher, "/ws/stream/{token}/")
+        student = self.connect(self.student, "/ws/stream/{token}/")
+        self.assertTrue((await teacher.connect())[0])
+        self.assertTrue((await student.connect())[0])
+        for _ in range(20):
+            await student.send_json_to(
+                {"stream": "presence", "payload": {"action": "typing", "course_id": self.course.id}}
+            )
+        await student.send_json_to({"stream": "control", "payload": {"action": "ping"}})
+        await student.receive_json_from()
+
+        await presence.flush()
+        frame = await teacher.receive_json_from()
+        self.assertEqual(frame["stream"], "presence")
+        self.assertEqual(frame["payload"]["course_id"], self.course.id)
+        self.assertEqual(
+            {member["id"] for member in frame["payload"]["online"]},
+            {self.teacher.id, self.student.id},
+        )
+        self.assertEqual([member["id"] for member in frame["payload"]["typing"]], [self.student.id])
+        # The other course only has the teacher; everything else was one diff.
+        other = await teacher.receive_json_from()
+        self.assertEqual(other["payload"]["course_id"], self.other_course.id)
+        self.assertTrue(await teacher.receive_nothing())
+        online = await sync_to_async(presence.snapshot)(self.course.id)
+        self.assertEqual({member["id"] for member in online}, {self.teacher.id, self.student.id})
+
+        await student.disconnect()
+        await presence.flush()
+        frame = await teacher.receive_json_from()
+        self.assertEqual(frame["payload"]["offline"], [self.student.id])
+        await teacher.disconnect()
+        await presence.flush()
+        await presence.close()
+        self.assertEqual(await sync_to_async(presence.snapshot)(self.course.id), [])
+
+    @override_settings(CHAT_RATE_LIMIT=0.01, CHAT_RATE_BURST=1, CHAT_MAX_MESSAGE_BYTES=64)
+    async def test_oversized_and_flooding_frames_are_rejected(self):
+        rejected = metrics.snapshot("chat.rejected.")
+        student = self.connect(self.student)
+        self.assertTrue((await student.connect())[0])
+        await student.send_json_to({"course_id": self.course.id, "message": "x" * 100})
+        self.assertEqual((await student.receive_json_from())["action"], "error")
+        await student.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        self.assertEqual((await student.receive_json_from())["message"], "Hi")
+        await student.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        self.assertEqual((await student.receive_json_from())["action"], "error")
+        self.assertEqual(await ChatMessage.objects.acount(), 1)
+
+        after = metrics.snapshot("chat.rejected.")
+        self.assertEqual(after["chat.rejected.oversized"], rejected.get("chat.rejected.oversized", 0) + 1)
+        self.assertEqual(
+            after["chat.rejected.connection_rate"],
+            rejected.get("chat.rejected.connection_rate", 0) + 1,
+        )
+        await student.disconnect()
+
+    def test_outbox_drops_oldest_or_asks_to_disconnect(self):
+        outbox = Outbox(2, policy="drop")
+        for frame in ("a", "b", "c"):
+            self.assertTrue(outbox.offer(frame))
+        self.assertEqual(len(outbox), 2)
+        self.assertEqual(async_to_sync(outbox.get)(), "b")
+
+        outbox = Outbox(1, policy="disconnect")
+        self.assertTrue(outbox.offer("a"))
+        self.assertFalse(outbox.offer("b"))
+
+    async def test_idle_sockets_are_pinged_then_reaped(self):
+        socket = self.connect(self.student, "/ws/stream/{token}/")
+        legacy = self.connect(self.teacher)
+        self.assertTrue((await socket.connect())[0])
+        self.assertTrue((await legacy.connect())[0])
+        reaped = metrics.counter("ws.connections.reaped").value
+        start = time.monotonic()
+
+        await registry.sweep(now=start + registry.interval)
+        self.assertEqual(
+            await socket.receive_json_from(), {"stream": "control", "payload": {"action": "ping"}}
+        )
+        await socket.send_json_to({"stream": "control", "payload": {"action": "pong"}})
+        await socket.receive_nothing()
+        self.assertEqual(await registry.sweep(now=start + registry.interval), 0)
+
+        self.assertEqual(await registry.sweep(now=time.monotonic() + registry.idle_timeout), 1)
+        self.assertEqual((await socket.receive_output())["type"], "websocket.close")
+        # Only the teacher's socket is left in the course group.
+        self.assertEqual(len(get_channel_layer().groups[f"chat_{self.course.id}"]), 1)
+        self.assertEqual(metrics.counter("ws.connections.reaped").value, reaped + 1)
+        # Clients that didn't ask for the heartbeat are left alone.
+        self.assertTrue(await legacy.receive_nothing())
+        await legacy.disconnect()
+        await registry.close()
+
+    def test_rooms_are_created_with_courses(self):
+        self.assertTrue(ChatRoom.objects.filter(course=self.course).exists())
+
+    async def capture_queries(self, *steps):
+        """Run `steps` in order and return the SQL they executed."""
+        executed = []
+        execute = CursorWrapper.execute
+
+        def recording_execute(cursor, sql, params=None):
+            executed.append(sql)
+            return execute(cursor, sql, params)
+
+        with mock.patch.object(CursorWrapper, "execute", recording_execute):
+            results = [await step for step in steps]
+        # Savepoints only exist because each test runs in a transaction.
+        executed = [sql for sql in executed if not sql.startswith(("SAVEPOINT", "RELEASE"))]
+        return executed, results
+
+    async def test_send_is_one_insert_and_a_broadcast(self):
+        teacher = self.connect(self.teacher)
+        student = self.connect(self.student)
+        self.assertTrue((await teacher.connect())[0])
+        self.assertTrue((await student.connect())[0])
+
+        queries, (_, received) = await self.capture_queries(
+            student.send_json_to({"course_id": self.course.id, "message": "Hi"}),
+            teacher.receive_json_from(),
+        )
+        self.assertEqual(received["message"], "Hi")
+        self.assertEqual(received["sender"]["id"], self.student.id)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith("INSERT"))
+        await student.receive_json_from()
+
+        queries, (_, error) = await self.capture_queries(
+            student.send_json_to({"course_id": self.other_course.id, "message": "Hi"}),
+            student.receive_json_from(),
+        )
+        self.assertEqual(error["action"], "error")
+        self.assertEqual(queries, [])
+        self.assertTrue(await teacher.receive_nothing())
+        self.assertEqual(await ChatMessage.objects.acount(), 1)
+
+        await teacher.disconnect()
+        await student.disconnect()
+
+    async def test_negotiated_encoding_is_encoded_once_per_broadcast(self):
+        codec = CODECS["pulikidz.msgpack+deflate"]
+        teacher = self.connect(self.teacher)
+        students = [
+            self.connect(self.student, "/ws/stream/{token}/", subprotocols=["x.unknown", codec.name])
+            for _ in range(2)
+        ]
+        self.assertEqual(await teacher.connect(), (True, None))
+        for student in students:
+            self.assertEqual(await student.connect(), (True, codec.name))
+        encoded = metrics.counter("chat.frames.encoded").value
+        reused = metrics.counter("chat.frames.reused").value
+
+        await students[0].send_to(
+            bytes_data=codec.dumps(
+                {"stream": "chat", "payload": {"course_id": self.course.id, "message": "Hi"}}
+            )
+        )
+        for student in students:
+            frame = codec.decode(await student.receive_from(), 4096)
+            self.assertEqual(frame["stream"], "chat")
+            self.assertEqual(frame["payload"]["message"], "Hi")
+        self.assertEqual((await teacher.receive_json_from())["message"], "Hi")
+        # One msgpack+deflate frame shared by both students, one JSON frame for the teacher.
+        self.assertEqual(metrics.counter("chat.frames.encoded").value, encoded + 2)
+        self.assertEqual(metrics.counter("chat.frames.reused").value, reused + 1)
+
+        await teacher.disconnect()
+        for student in students:
+            await student.disconnect()
+
+    @override_settings(PRESENCE_BROADCAST_INTERVAL=60)
+    async def test_unread_counts_are_pushed_to_every_socket_of_the_user(self):
+        await presence.flush()
+        teacher = self.connect(self.teacher)
+        stream = self.connect(self.student, "/ws/stream/{token}/")
+        chat = self.connect(self.student)
+        for communicator in (teacher, stream, chat):
+            self.assertTrue((await communicator.connect())[0])
+
+        await teacher.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        sent = await teacher.receive_json_from()
+        self.assertEqual((await stream.receive_json_from())["payload"]["id"], sent["id"])
+        frame = await stream.receive_json_from()
+        self.assertEqual(frame["payload"]["action"], "unread")
+        self.assertEqual(frame["payload"]["rooms"][0]["course_id"], self.course.id)
+        self.assertEqual(frame["payload"]["rooms"][0]["unread"], 1)
+        self.assertEqual((await chat.receive_json_from())["id"], sent["id"])
+
+        await chat.send_json_to({"action": "read", "course_id": self.course.id})
+        frame = await stream.receive_json_from()
+        self.assertEqual(frame["payload"]["rooms"][0]["unread"], 0)
+        self.assertEqual(frame["payload"]["rooms"][0]["last_read_id"], sent["id"])
+        # Plain chat sockets only ever get message frames.
+        self.assertTrue(await chat.receive_nothing())
+        self.assertTrue(await teacher.receive_nothing())
+
+        for communicator in (teacher, stream, chat):
+            await communicator.disconnect()
+        await presence.flush()
+
+    async def test_blocked_students_cannot_send(self):
+        await CourseEnrollment.objects.filter(student=self.student).aupdate(is_blocked=True)
+        student = self.connect(self.student)
+        self.assertTrue((await student.connect())[0])
+        await student.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        self.assertEqual((await student.receive_json_from())["action"], "error")
+        await student.disconnect()
+
+    @override_settings(CHAT_PERSISTENCE="buffered", CHAT_BUFFER_FLUSH_INTERVAL_MS=60000)
+    async def test_buffered_messages_are_broadcast_before_they_are_written(self):
+        student = self.connect(self.student)
+        self.assertTrue((await student.connect())[0])
+        await student.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        received = await student.receive_json_from()
+        self.assertEqual(await ChatMessage.objects.acount(), 0)
+        self.assertEqual(writer.pending_count(), 1)
+
+        self.assertEqual(await writer.close(), 1)
+        message = await ChatMessage.objects.aget()
+        self.assertEqual(message.id, received["id"])
+        self.assertEqual(message.message, "Hi")
+        await student.disconnect()
+
+    @override_settings(CHAT_PERSISTENCE="buffered", CHAT_BUFFER_FLUSH_INTERVAL_MS=60000)
+    async def test_buffered_retry_after_reconnect_is_not_broadcast_again(self):
+        teacher = self.connect(self.teacher)
+        self.assertTrue((await teacher.connect())[0])
+        send = {"course_id": self.course.id, "message": "Hi", "client_key": "k1"}
+        for flush in (False, True):
+            student = self.connect(self.student)
+            self.assertTrue((await student.connect())[0])
+            await student.send_json_to(send)
+            first = await student.receive_json_from()
+            await student.disconnect()
+            if flush:
+                await writer.flush()
+
+            student = self.connect(self.student)
+            self.assertTrue((await student.connect())[0])
+            await student.send_json_to(send)
+            self.assertEqual((await student.receive_json_from())["id"], first["id"])
+            await student.disconnect()
+            self.assertEqual((await teacher.receive_json_from())["id"], first["id"])
+            self.assertTrue(await teacher.receive_nothing())
+            send["client_key"] = "k2"
+        await writer.close()
+        self.assertEqual(await ChatMessage.objects.acount(), 2)
+        await teacher.disconnect()
+
+    @override_settings(
+        CHAT_PERSISTENCE="buffered",
+        CHAT_BUFFER_FLUSH_INTERVAL_MS=10,
+        CHAT_BUFFER_DURABLE=True,
+    )
+    async def test_durable_buffered_messages_are_written_before_broadcast(self):
+        student = self.connect(self.student)
+        self.assertTrue((await student.connect())[0])
+        await student.send_json_to({"course_id": self.course.id, "message": "Hi"})
+        received = await student.receive_json_from()
+        self.assertTrue(await ChatMessage.objects.filter(id=received["id"]).aexists())
+        await writer.close()
+        await student.disconnect()
+
+    @override_settings(CHAT_BUFFER_FLUSH_INTERVAL_MS=60000)
+    async def test_buffered_flush_drops_only_messages_that_cannot_be_written(self):
+        room = await ChatRoom.objects.aget(course=self.course)
+        stored = await ChatMessage.objects.acreate(
+            room=room, sender=self.student, message="Hi", client_key="a"
+        )
+        retried = ChatMessage(room=room, sender=self.student, message="Hi", client_key="a")
+        clashing = ChatMessage(id=stored.id, room=room, sender=self.student, message="Clash")
+        fresh = ChatMessage(room=room, sender=self.student, message="Next")
+        dropped = metrics.counter("chat.buffer.dropped").value
+        for message in (retried, clashing, fresh):
+            await writer.submit(message)
+        with self.assertLogs("apps.chat.persistence", "ERROR"):
+            self.assertEqual(await writer.close(), 2)
+        self.assertEqual(writer.pending_count(), 0)
+        self.assertEqual(metrics.counter("chat.buffer.dropped").value, dropped + 1)
+        messages = [m async for m in ChatMessage.objects.order_by("id")]
+        self.assertEqual([m.message for m in messages], ["Hi", "Next"])
+
+    def test_buffered_persistence_requires_a_worker_id(self):
+        with override_settings(CHAT_PERSISTENCE="buffered", SNOWFLAKE_WORKER_ID=None):
+            with self.assertRaises(ImproperlyConfigured):
+                check_worker_id()
+        with override_settings(CHAT_PERSISTENCE="buffered", SNOWFLAKE_WORKER_ID="3"):
+            check_worker_id()
+
+    def test_id_taken_by_another_process_is_retried_with_a_new_one(self):
+        room = ChatRoom.objects.get(course=self.course)
+        stored = ChatMessage.objects.create(room=room, sender=self.teacher, message="first")
+        consumer = ChatConsumer()
+        consumer.user = self.student
+        message = ChatMessage(id=stored.id, room=room, sender=self.student, message="second")
+        saved, created = consumer.save_once(message)
+        self.assertTrue(created)
+        self.assertNotEqual(saved.id, stored.id)
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_snowflake_ids_increase_and_fit_javascript_numbers(self):
+        ids = [snowflake_id() for _ in range(1000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertLess(ids[-1], 2**53)
@@ -0,0 +1,110 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from channels.exceptions import ChannelFull
+from django.test import SimpleTestCase
+from apps.base import metrics
+from ..layers import ShardedChannelLayer, SQLiteChannelLayer
+
+MEMORY = {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = str(Path(directory.name) / "channels.sqlite3")
+
+    def make_layer(self, **config):
+        layer = SQLiteChannelLayer(location=self.location, **config)
+        self.addCleanup(layer._executor.shutdown)
+        return layer
+
+    async def test_group_send_reaches_other_process(self):
+        sender, receiver = self.make_layer(), self.make_layer()
+        channel = await receiver.new_channel()
+        await receiver.group_add_many(["course_1", "course_2"], channel)
+
+        await sender.group_send("course_2", {"type": "chat.message", "body": b"\x00hi"})
+        message = await asyncio.wait_for(receiver.receive(channel), 2)
+        self.assertEqual(message, {"type": "chat.message", "body": b"\x00hi"})
+
+        await receiver.group_discard("course_2", channel)
+        await sender.group_send("course_2", {"type": "chat.message"})
+        await sender.group_send("course_1", {"type": "chat.membership"})
+        message = await asyncio.wait_for(receiver.receive(channel), 2)
+        self.assertEqual(message["type"], "chat.membership")
+        await receiver.close()
+
+    async def test_full_channel_refuses_messages(self):
+        layer = self.make_layer(capacity=2)
+        channel = await layer.new_channel()
+        await layer.group_add("course_1", channel)
+        await layer.send(channel, {"type": "one"})
+        await layer.group_send("course_1", {"type": "two"})
+        await layer.group_send("course_1", {"type": "three"})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {"type": "four"})
+
+        received = [await asyncio.wait_for(layer.receive(channel), 2) for _ in range(2)]
+        self.assertEqual([message["type"] for message in received], ["one", "two"])
+        await layer.close()
+
+    async def test_expired_membership_gets_nothing(self):
+        layer = self.make_layer(group_expiry=0)
+        channel = await layer.new_channel()
+        await layer.group_add("course_1", channel)
+        await layer.group_send("course_1", {"type": "chat.message"})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), 0.2)
+        await layer.close()
+
+
+class ShardedChannelLayerTests(SimpleTestCase):
+    groups = [f"chat_{course_id}" for course_id in range(200)]
+
+    def placement(self, layer):
+        return {group: layer.names[layer.shard_index(group)] for group in self.groups}
+
+    async def test_groups_on_every_shard_reach_the_channel(self):
+        layer = ShardedChannelLayer(shards=[MEMORY, MEMORY, MEMORY])
+        placement = self.placement(layer)
+        self.assertEqual(set(placement.values()), {"0", "1", "2"})
+        groups = [next(g for g in self.groups if placement[g] == name) for name in "012"]
+
+        channel = await layer.new_channel()
+        await layer.group_add_many(groups, channel)
+        before = metrics.counter("channels.shard.1.group_sends").value
+        for group in groups:
+            await layer.group_send(group, {"type": "chat.message", "group": group})
+        received = {
+            (await asyncio.wait_for(layer.receive(channel), 1))["group"] for _ in groups
+        }
+        self.assertEqual(received, set(groups))
+        self.assertEqual(metrics.counter("channels.shard.1.group_sends").value, before + 1)
+
+        await layer.send(channel, {"type": "chat.membership"})
+        message = await asyncio.wait_for(layer.receive(channel), 1)
+        self.assertEqual(message["type"], "chat.membership")
+        await layer.close()
+
+    async def test_reshard_moves_only_affected_memberships(self):
+        layer = ShardedChannelLayer(shards=[MEMORY, MEMORY])
+        before = self.placement(layer)
+        channel = await layer.new_channel()
+        await layer.group_add_many(self.groups, channel)
+        reader = asyncio.create_task(layer.receive(channel))
+        await asyncio.sleep(0)
+
+        moved = await layer.reshard([MEMORY, MEMORY, MEMORY])
+        after = self.placement(layer)
+        changed = [group for group in self.groups if before[group] != after[group]]
+        self.assertEqual(moved, len(changed))
+        self.assertLess(len(changed), len(self.groups) / 2)
+        self.assertTrue(all(after[group] == "2" for group in changed))
+
+        await layer.group_send(changed[0], {"type": "chat.message"})
+        message = await asyncio.wait_for(reader, 1)
+        self.assertEqual(message["type"], "chat.message")
+        self.assertNotIn(channel, layer.shards[0].groups.get(changed[0], {}))
+        await layer.close()
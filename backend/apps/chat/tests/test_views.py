@@ -1,8 +1,12 @@
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import async_to_sync
+from ..presence import tracker as presence
 from ..models import ChatRoom, ChatMessage
-from apps.courses.models import Course
+from apps.courses.models import Course, CourseEnrollment
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -13,7 +17,7 @@ class ChatTests(APITestCase):
         self.client.force_authenticate(user=self.user)
 
         self.course = Course.objects.create(title="Test Course", instructor=self.user)  # Create a course
-        self.chat_room = ChatRoom.objects.create(course=self.course)
+        self.chat_room = self.course.chat_room
 
         self.chat_room_url = reverse('chat-room-detail', kwargs={'course_id': self.course.id})
         self.chat_message_list_url = reverse('chat-message-list', kwargs={'course_id': self.course.id})
@@ -49,4 +53,110 @@ class ChatTests(APITestCase):
       self.client.force_authenticate(user=None)
 
       response = self.client.get(self.chat_message_list_url)
-      self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+      self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    def test_chat_message_list_cursor_pagination(self):
+        for text in ("one", "two", "three"):
+            ChatMessage.objects.create(room=self.chat_room, sender=self.user, message=text)
+
+        response = self.client.get(self.chat_message_list_url, {"pagination": "cursor", "limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual([m['message'] for m in response.data['results']], ["one", "two"])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([m['message'] for m in response.data['results']], ["three"])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([m['message'] for m in response.data['results']], ["one", "two"])
+
+    def test_chat_message_list_without_count(self):
+        for text in ("one", "two", "three"):
+            ChatMessage.objects.create(room=self.chat_room, sender=self.user, message=text)
+
+        response = self.client.get(self.chat_message_list_url, {"count": "false", "limit": 2})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([m['message'] for m in response.data['results']], ["three"])
+        self.assertIsNone(response.data['next'])
+
+    def test_chat_message_list_invalid_cursor(self):
+        response = self.client.get(self.chat_message_list_url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_chat_message_list_uses_fixed_number_of_queries(self):
+        ChatMessage.objects.create(room=self.chat_room, sender=self.user, message="first")
+        with CaptureQueriesContext(connection) as one_message:
+            self.client.get(self.chat_message_list_url)
+        others = [
+            User.objects.create_user(email=f"user{i}@example.com", password="testpassword")
+            for i in range(5)
+        ]
+        ChatMessage.objects.bulk_create(
+            ChatMessage(room=self.chat_room, sender=others[i % 5], message=str(i))
+            for i in range(50)
+        )
+        with CaptureQueriesContext(connection) as many_messages:
+            response = self.client.get(self.chat_message_list_url, {"limit": 100})
+
+        self.assertEqual(len(response.data['results']), 51)
+        self.assertEqual(len(many_messages), len(one_message))
+        self.assertEqual(set(response.data['results'][1]['sender']), {"id", "name", "profile_pic"})
+
+    def test_chat_presence_lists_online_members(self):
+        outsider = User.objects.create_user(email='outsider@example.com', password='testpassword')
+        presence.join(self.course.id, self.user)
+        self.addCleanup(lambda: async_to_sync(presence.flush)())
+        self.addCleanup(presence.leave, self.course.id, self.user.id)
+        async_to_sync(presence.flush)()
+
+        response = self.client.get(reverse('chat-presence', kwargs={'course_id': self.course.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['online'], [{"id": self.user.id, "name": self.user.name}])
+
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(reverse('chat-presence', kwargs={'course_id': self.course.id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        CourseEnrollment.objects.create(student=outsider, course=self.course, is_blocked=True)
+        response = self.client.get(reverse('chat-presence', kwargs={'course_id': self.course.id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unread_counts_every_room_in_one_query(self):
+        student = User.objects.create_user(email='student@example.com', password='testpassword')
+        other_course = Course.objects.create(title="Other Course", instructor=student)
+        CourseEnrollment.objects.create(student=student, course=self.course)
+        messages = [
+            ChatMessage.objects.create(room=self.chat_room, sender=self.user, message=str(i))
+            for i in range(3)
+        ]
+        ChatMessage.objects.create(room=self.chat_room, sender=student, message="mine")
+        self.client.force_authenticate(user=student)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('chat-unread'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 3)
+        rooms = {room['course_id']: room for room in response.data['rooms']}
+        self.assertEqual(rooms[self.course.id]['unread'], 3)
+        self.assertEqual(rooms[other_course.id]['unread'], 0)
+        # One for the user's courses, one for every room's counts.
+        self.assertEqual(len(queries), 2)
+
+        read_url = reverse('chat-read', kwargs={'course_id': self.course.id})
+        response = self.client.post(read_url, {"message_id": messages[1].id})
+        self.assertEqual(response.data['last_read_id'], messages[1].id)
+        self.assertEqual(response.data['unread'], 1)
+        # Markers never move back.
+        response = self.client.post(read_url, {"message_id": messages[0].id})
+        self.assertEqual(response.data['last_read_id'], messages[1].id)
+        response = self.client.post(read_url)
+        self.assertEqual(response.data['unread'], 0)
+        self.assertEqual(self.client.get(reverse('chat-unread')).data['total'], 0)
+
+        outsider = User.objects.create_user(email='outsider@example.com', password='testpassword')
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.post(read_url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('chat-unread')).data, {"rooms": [], "total": 0})
@@ -0,0 +1,66 @@
+"""
+Unread counts per chat room.
+
+A user's unread count in a room is the number of messages after their read
+marker that someone else sent. It is counted off the (room, id) index when
+asked for, so nothing has to be kept up to date per message; open sockets
+add to the counts they loaded as messages arrive.
+"""
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import ChatMessage, ChatReadMarker, ChatRoom
+
+
+def unread_counts(user, course_ids):
+    """
+    Read marker, newest message id and unread count of each course chat,
+    for all of `course_ids` in one query.
+    """
+    last_read = ChatReadMarker.objects.filter(user=user, room=OuterRef("pk")).values(
+        "last_read_id"
+    )[:1]
+    messages = ChatMessage.objects.filter(room=OuterRef("pk")).order_by().values("room")
+    latest = messages.annotate(latest=Max("id")).values("latest")
+    unread = (
+        messages.filter(id__gt=OuterRef("last_read_id"))
+        .exclude(sender=user)
+        .annotate(unread=Count("*"))
+        .values("unread")
+    )
+    rooms = (
+        ChatRoom.objects.filter(course_id__in=course_ids)
+        .annotate(last_read_id=Coalesce(Subquery(last_read), Value(0)))
+        .annotate(
+            latest_id=Coalesce(Subquery(latest), Value(0)),
+            unread=Coalesce(Subquery(unread), Value(0)),
+        )
+        .order_by("course_id")
+        .values("course_id", "last_read_id", "latest_id", "unread", room_id=F("pk"))
+    )
+    return list(rooms)
+
+
+def mark_read(user, room_id, message_id=None):
+    """
+    Move the user's marker in a room forward to `message_id`, or to the
+    newest message; returns the marker and what is still unread after it.
+    """
+    latest = ChatMessage.objects.filter(room_id=room_id).aggregate(latest=Max("id"))
+    latest = latest["latest"] or 0
+    target = latest if message_id is None else min(message_id, latest)
+    updated = ChatReadMarker.objects.filter(
+        user=user, room_id=room_id, last_read_id__lt=target
+    ).update(last_read_id=target)
+    if updated:
+        last_read_id = target
+    else:
+        marker, _ = ChatReadMarker.objects.get_or_create(
+            user=user, room_id=room_id, defaults={"last_read_id": target}
+        )
+        last_read_id = marker.last_read_id
+    unread = (
+        ChatMessage.objects.filter(room_id=room_id, id__gt=last_read_id)
+        .exclude(sender=user)
+        .count()
+    )
+    return last_read_id, unread
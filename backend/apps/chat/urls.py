@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import ChatRoomDetail, ChatMessageList
+from .views import ChatRoomDetail, ChatMessageList, ChatPresenceView, ChatReadView, ChatUnreadView
 
 urlpatterns = [
     path('rooms/<int:course_id>/', ChatRoomDetail.as_view(), name='chat-room-detail'),
     path('rooms/<int:course_id>/messages/', ChatMessageList.as_view(), name='chat-message-list'),
+    path('rooms/<int:course_id>/presence/', ChatPresenceView.as_view(), name='chat-presence'),
+    path('rooms/<int:course_id>/read/', ChatReadView.as_view(), name='chat-read'),
+    path('unread/', ChatUnreadView.as_view(), name='chat-unread'),
 ]
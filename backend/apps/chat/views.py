@@ -1,6 +1,12 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from apps.courses.access import get_course_access
 from .models import ChatRoom, ChatMessage
-from .serializers import ChatRoomSerializer, ChatMessageSerializer
+from .presence import tracker as presence
+from .serializers import ChatRoomSerializer, ChatMessageSerializer, ChatReadSerializer
+from .signals import notify_read
+from .unread import mark_read, unread_counts
 
 class ChatRoomDetail(generics.RetrieveAPIView):
     """
@@ -17,10 +23,82 @@ class ChatRoomDetail(generics.RetrieveAPIView):
 class ChatMessageList(generics.ListAPIView):
     """
     List all chat messages for a given course (by course id).
+
+    The room is looked up once so the page is read straight off the
+    (room, timestamp, id) index, with senders joined in.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ChatMessageSerializer
+    keyset_ordering = ("timestamp", "id")
 
     def get_queryset(self):
         course_id = self.kwargs.get("course_id")
-        return ChatMessage.objects.filter(room__course__id=course_id).order_by("timestamp")
+        room_id = ChatRoom.objects.filter(course_id=course_id).values_list(
+            "id", flat=True
+        ).first()
+        if room_id is None:
+            return ChatMessage.objects.none()
+        return (
+            ChatMessage.objects.filter(room_id=room_id)
+            .select_related("sender")
+            .only(
+                "id", "room_id", "message", "timestamp",
+                "sender__id", "sender__name", "sender__profile_pic",
+            )
+            .order_by("timestamp", "id")
+        )
+
+
+class ChatPresenceView(APIView):
+    """
+    Who is online in a course chat right now. Live changes come over the
+    multiplexed socket as presence frames.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, course_id):
+        if course_id not in get_course_access(request).member_course_ids:
+            raise serializers.ValidationError(
+                {"message": "You don't have permissions to perform this action."}
+            )
+        return Response({"course_id": course_id, "online": presence.snapshot(course_id)})
+
+
+class ChatUnreadView(APIView):
+    """
+    Read markers and unread counts of every course chat the user belongs
+    to. Live changes come over the multiplexed socket as unread frames.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        rooms = unread_counts(request.user, get_course_access(request).member_course_ids)
+        return Response({"rooms": rooms, "total": sum(room["unread"] for room in rooms)})
+
+
+class ChatReadView(APIView):
+    """
+    Mark a course chat read up to `message_id`, or up to its newest message.
+    Markers only move forward.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, course_id):
+        if course_id not in get_course_access(request).member_course_ids:
+            raise serializers.ValidationError(
+                {"message": "You don't have permissions to perform this action."}
+            )
+        serializer = ChatReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        room_id = ChatRoom.objects.filter(course_id=course_id).values_list(
+            "id", flat=True
+        ).first()
+        if room_id is None:
+            raise serializers.ValidationError({"message": "This course has no chat."})
+        last_read_id, unread = mark_read(
+            request.user, room_id, serializer.validated_data.get("message_id")
+        )
+        notify_read(request.user.id, course_id, last_read_id, unread)
+        return Response(
+            {"course_id": course_id, "last_read_id": last_read_id, "unread": unread}
+        )
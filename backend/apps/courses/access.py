@@ -0,0 +1,105 @@
+from django.db.models import FilteredRelation, Q
+from .models import Course
+
+
+class CourseAccess:
+    """
+    Which courses the requesting user teaches, is enrolled in or is blocked
+    from. Everything is loaded with a single query the first time any of it
+    is asked for, and shared by the views and serializers of the request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._loaded = False
+        self._authored = set()
+        self._enrolled = set()
+        self._blocked = set()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.user.is_authenticated:
+            return
+        rows = (
+            Course.objects.annotate(
+                own_enrollment=FilteredRelation(
+                    "enrollments", condition=Q(enrollments__student=self.user)
+                )
+            )
+            .filter(Q(instructor=self.user) | Q(own_enrollment__id__isnull=False))
+            .values_list(
+                "id", "instructor_id", "own_enrollment__id", "own_enrollment__is_blocked"
+            )
+        )
+        for course_id, instructor_id, enrollment_id, is_blocked in rows:
+            if instructor_id == self.user.id:
+                self._authored.add(course_id)
+            if enrollment_id is not None:
+                self._enrolled.add(course_id)
+                if is_blocked:
+                    self._blocked.add(course_id)
+
+    def invalidate(self):
+        self._loaded = False
+        self._authored, self._enrolled, self._blocked = set(), set(), set()
+
+    @property
+    def authored_course_ids(self):
+        self._load()
+        return self._authored
+
+    @property
+    def enrolled_course_ids(self):
+        self._load()
+        return self._enrolled
+
+    @property
+    def blocked_course_ids(self):
+        self._load()
+        return self._blocked
+
+    @property
+    def member_course_ids(self):
+        """Courses the user teaches or takes without being blocked."""
+        return self.authored_course_ids | (
+            self.enrolled_course_ids - self.blocked_course_ids
+        )
+
+    def is_instructor(self, course_id):
+        return course_id in self.authored_course_ids
+
+    def is_enrolled(self, course_id):
+        return course_id in self.enrolled_course_ids
+
+    def is_blocked(self, course_id):
+        return course_id in self.blocked_course_ids
+
+    def can_view_contents(self, course_id):
+        return self.is_instructor(course_id) or self.is_enrolled(course_id)
+
+
+def get_course_access(request):
+    """The CourseAccess of `request`, created on first use."""
+    user = request.user
+    # Keep it on the Django request so DRF's Request wrapper shares it too.
+    request = getattr(request, "_request", request)
+    access = getattr(request, "course_access", None)
+    if access is None or access.user != user:
+        access = request.course_access = CourseAccess(user)
+    return access
+
+
+def course_access_from_context(context):
+    """The CourseAccess a serializer was handed, or the request's own one."""
+    return context.get("access") or get_course_access(context["request"])
+
+
+class CourseAccessMixin:
+    """Puts the request's CourseAccess in the serializer context."""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["access"] = get_course_access(self.request)
+        return context
@@ -4,7 +4,7 @@ from .models import Course, CourseEnrollment, Module, ModuleContent
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ("title", "instructor", "id")
+    list_display = ("title", "instructor", "rating_avg", "rating_count", "id")
     search_fields = ("title", "instructor__email")
     list_filter = ("instructor",)
     raw_id_fields = ("instructor",)
@@ -1,6 +1,7 @@
 import django_filters
 from .models import Course, Module, CourseEnrollment
 from django.db.models import Q
+from .search import get_search_backend
 
 class CourseEnrollmentFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method="search_filter")
@@ -19,6 +20,9 @@ class CourseEnrollmentFilter(django_filters.FilterSet):
 
 class CourseFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method="search_filter")
+    # Only these columns may be sorted on, ascending or with a leading "-".
+    order_by = django_filters.OrderingFilter(fields=("rating_avg", "created_at", "title"))
+    min_rating = django_filters.NumberFilter(field_name="rating_avg", lookup_expr="gte")
     student = django_filters.CharFilter(field_name="enrollments__student", lookup_expr="exact")
     teacher = django_filters.CharFilter(field_name="instructor__id", lookup_expr="iexact")
     class Meta:
@@ -26,14 +30,7 @@ class CourseFilter(django_filters.FilterSet):
         fields = ["id", "title", "instructor"]
 
     def search_filter(self, qs, name, value):
-        keywords = [keyword.lower() for keyword in value.split()]
-        filtered_queryset = qs
-        searched_qs = qs.none()
-        for keyword in keywords:
-            searched_qs |= filtered_queryset.filter(
-                Q(title__icontains=keyword) | Q(description__icontains=keyword)
-            )
-        return searched_qs.order_by("title", "description")
+        return get_search_backend().search(qs, value)
 
 
 class ModuleFilter(django_filters.FilterSet):
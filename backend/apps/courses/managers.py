@@ -0,0 +1,24 @@
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_listing_info(self):
+        """
+        Annotate everything CourseSerializer needs so that a page of courses
+        is serialized without any per-row queries. The requesting user's own
+        enrollment state comes from apps.courses.access.CourseAccess.
+        """
+        from .models import Course
+
+        instructor_courses = (
+            Course.objects.filter(instructor=OuterRef("instructor"))
+            .order_by()
+            .values("instructor")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return self.select_related("instructor").annotate(
+            instructor_total_course=Coalesce(Subquery(instructor_courses), 0),
+        )
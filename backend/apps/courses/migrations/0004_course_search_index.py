@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from apps.courses.search import get_search_backend
+
+    get_search_backend(schema_editor.connection).install()
+
+
+def uninstall_search_index(apps, schema_editor):
+    from apps.courses.search import get_search_backend
+
+    get_search_backend(schema_editor.connection).uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
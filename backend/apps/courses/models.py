@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from apps.base.models import BaseModelWithoutID
+from .managers import CourseQuerySet
 
 User = get_user_model()
 
@@ -13,10 +14,26 @@ class Course(BaseModelWithoutID):
     instructor = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="courses_created"
     )
+    # Rating aggregates, maintained by apps.feedback.ratings on every
+    # feedback write and rebuilt by the `rebuild_ratings` command.
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0, db_index=True)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    objects = CourseQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    @property
+    def rating_distribution(self):
+        return {star: getattr(self, f"rating_{star}") for star in range(1, 6)}
+
 
 class CourseEnrollment(BaseModelWithoutID):
     """Tracks which students are enrolled in which courses."""
@@ -30,6 +47,11 @@ class CourseEnrollment(BaseModelWithoutID):
     is_blocked = models.BooleanField(default=False)
     class Meta:
         unique_together = ("student", "course")
+        indexes = [
+            models.Index(
+                fields=["course", "created_at", "id"], name="enrollment_course_ts_idx"
+            ),
+        ]
 
 
 class Module(BaseModelWithoutID):
@@ -0,0 +1,210 @@
+"""
+Full-text search over courses.
+
+Each course gets one search document built from its title, description and
+module titles. SQLite keeps the documents in an FTS5 table and Postgres in a
+GIN-indexed tsvector table; both sit behind the same small interface so the
+catalog filter doesn't care which database it runs on.
+"""
+import re
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Course, Module
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or "")]
+
+
+class BaseSearchBackend:
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+        self.course_table = Course._meta.db_table
+        self.module_table = Module._meta.db_table
+        self.table = f"{self.course_table}_search"
+
+    def install(self):
+        """Create the index table and fill it from the existing courses."""
+
+    def uninstall(self):
+        """Drop the index table."""
+
+    def index(self, course_ids):
+        """(Re)build the search documents of the given courses."""
+
+    def remove(self, course_ids):
+        """Drop the search documents of the given courses."""
+
+    def rebuild(self):
+        self.uninstall()
+        self.install()
+
+    def search(self, queryset, text):
+        """Filter `queryset` down to matching courses, best match first."""
+        raise NotImplementedError
+
+    def execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # bm25() weights for the title, description and module title columns.
+    weights = (10.0, 1.0, 5.0)
+
+    def install(self):
+        self.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "title, description, modules, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, title, description, modules) "
+            f"{self._documents_sql()}"
+        )
+
+    def uninstall(self):
+        self.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, course_ids):
+        course_ids = list(course_ids)
+        if not course_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(course_ids))
+        self.remove(course_ids)
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, title, description, modules) "
+            f"{self._documents_sql()} WHERE c.id IN ({placeholders})",
+            course_ids,
+        )
+
+    def remove(self, course_ids):
+        course_ids = list(course_ids)
+        if not course_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(course_ids))
+        self.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", course_ids
+        )
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset.none()
+        match = " OR ".join(f'"{token}"*' for token in tokens)
+        weights = ", ".join(str(weight) for weight in self.weights)
+        # The index is joined into the query once, so bm25() comes from the
+        # same scan as the match and every other filter, count and page
+        # applies to the full set of matches. bm25() is lower-is-better, so
+        # the ascending order ranks best first.
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"{self.table}.rowid = {self.course_table}.id", f"{self.table} MATCH %s"],
+            params=[match],
+            select={"search_rank": f"bm25({self.table}, {weights})"},
+            order_by=["search_rank", "id"],
+        )
+
+    def _documents_sql(self):
+        return (
+            f"SELECT c.id, c.title, c.description, "
+            f"COALESCE((SELECT group_concat(m.title, ' ') FROM {self.module_table} m "
+            f"WHERE m.course_id = c.id), '') FROM {self.course_table} c"
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    config = "simple"
+
+    def install(self):
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"course_id bigint PRIMARY KEY REFERENCES {self.course_table} (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        self.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx "
+            f"ON {self.table} USING GIN (document)"
+        )
+        self.execute(
+            f"INSERT INTO {self.table} (course_id, document) {self._documents_sql()}"
+        )
+
+    def uninstall(self):
+        self.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, course_ids):
+        self.execute(
+            f"INSERT INTO {self.table} (course_id, document) "
+            f"{self._documents_sql()} WHERE c.id = ANY(%s) "
+            "ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+            [list(course_ids)],
+        )
+
+    def remove(self, course_ids):
+        self.execute(
+            f"DELETE FROM {self.table} WHERE course_id = ANY(%s)", [list(course_ids)]
+        )
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset.none()
+        query = " | ".join(f"{token}:*" for token in tokens)
+        matching = RawSQL(
+            f"SELECT course_id FROM {self.table} "
+            f"WHERE document @@ to_tsquery('{self.config}', %s)",
+            [query],
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('{self.config}', %s)) "
+            f"FROM {self.table} WHERE course_id = {self.course_table}.id",
+            [query],
+        )
+        return (
+            queryset.filter(id__in=matching)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "id")
+        )
+
+    def _documents_sql(self):
+        return (
+            f"SELECT c.id, "
+            f"setweight(to_tsvector('{self.config}', c.title), 'A') || "
+            f"setweight(to_tsvector('{self.config}', COALESCE((SELECT string_agg(m.title, ' ') "
+            f"FROM {self.module_table} m WHERE m.course_id = c.id), '')), 'B') || "
+            f"setweight(to_tsvector('{self.config}', c.description), 'C') "
+            f"FROM {self.course_table} c"
+        )
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for databases without a full-text backend."""
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset.none()
+        condition = Q()
+        for token in tokens:
+            condition |= (
+                Q(title__icontains=token)
+                | Q(description__icontains=token)
+                | Q(modules__title__icontains=token)
+            )
+        return queryset.filter(condition).distinct().order_by("title", "id")
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(connection=None):
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, LikeSearchBackend)(connection)
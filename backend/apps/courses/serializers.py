@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Course, Module, ModuleContent, CourseEnrollment
 from apps.users.serializers import ProfileSerializer
-from django.db.models import Avg
+from .access import course_access_from_context
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -11,6 +11,7 @@ class CourseSerializer(serializers.ModelSerializer):
     has_enrolled = serializers.SerializerMethodField()
     is_blocked = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
+    rating_distribution = serializers.DictField(read_only=True)
 
 
     class Meta:
@@ -24,8 +25,11 @@ class CourseSerializer(serializers.ModelSerializer):
             "banner",
             "has_enrolled",
             "rating",
+            "rating_count",
+            "rating_distribution",
             "is_blocked",
         ]
+        read_only_fields = ["rating_count"]
 
     def create(self, validated_data):
         user = self.context["request"].user
@@ -38,31 +42,35 @@ class CourseSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         print("here")
         user = self.context["request"].user
-        if instance.instructor != user:
+        if instance.instructor_id != user.id:
             raise serializers.ValidationError(
                 "You don't have permissions to update other's course."
             )
         return super().update(instance, validated_data)
 
+    def to_representation(self, instance):
+        # Hand the instructor's course count annotated on the course over to
+        # the nested ProfileSerializer so it doesn't query it again.
+        if hasattr(instance, "instructor_total_course"):
+            instance.instructor.total_course_count = instance.instructor_total_course
+        return super().to_representation(instance)
+
     def get_has_enrolled(self, obj):
         user = self.context["request"].user
         if not user.is_authenticated:
             return False
-        if user == obj.instructor or user.enrolled_courses.filter(course=obj).exists():
+        if obj.instructor_id == user.id:
             return True
-        return False
+        return course_access_from_context(self.context).is_enrolled(obj.id)
     
     def get_rating(self, obj):
-        avg_rating = obj.feedbacks.aggregate(
-            Avg("rating")
-        )["rating__avg"]
-        return avg_rating if avg_rating else 1
+        return obj.rating_avg if obj.rating_count else 1
     
     def get_is_blocked(self, obj):
         user = self.context["request"].user
         if not user.is_authenticated:
             return True
-        return obj.enrollments.filter(student=user, is_blocked=True).exists()
+        return course_access_from_context(self.context).is_blocked(obj.id)
 
 
 
@@ -76,22 +84,16 @@ class ModuleSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "course", "order", "module_contents"]
 
     def get_module_contents(self, obj):
-        user = self.context["request"].user
-        if not user.is_authenticated:
-            return []
-        if not (
-            obj.course.instructor == user
-            or user.enrolled_courses.filter(course=obj.course).exists()
-        ):
+        access = course_access_from_context(self.context)
+        if not access.can_view_contents(obj.course_id):
             return []
         return ModuleContentSerializer(
             obj.contents.all(), many=True, context=self.context
         ).data
 
     def create(self, validated_data):
-        user = self.context["request"].user
         course = validated_data["course"]
-        if course.instructor != user:
+        if not course_access_from_context(self.context).is_instructor(course.id):
             raise serializers.ValidationError(
                 {
                     "message": "You do not have permissions to add modules to this course."
@@ -100,8 +102,8 @@ class ModuleSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        user = self.context["request"].user
-        if instance.course.instructor != user:
+        access = course_access_from_context(self.context)
+        if not access.is_instructor(instance.course_id):
             raise serializers.ValidationError(
                 {
                     "message": "You do not have permissions to update modules of this course."
@@ -148,17 +150,16 @@ class ModuleContentSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        user = self.context["request"].user
         module = validated_data["module"]
-        if module.course.instructor != user:
+        if not course_access_from_context(self.context).is_instructor(module.course_id):
             raise serializers.ValidationError(
                 {"message": "You do not have permission to add content to this module."}
             )
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        user = self.context["request"].user
-        if instance.module.course.instructor != user:
+        access = course_access_from_context(self.context)
+        if not access.is_instructor(instance.module.course_id):
             raise serializers.ValidationError(
                 {
                     "message": "You do not have permission to update content of this module."
@@ -168,6 +169,23 @@ class ModuleContentSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class OutlineModuleSerializer(ModuleSerializer):
+    """A module of CourseOutlineSerializer."""
+
+    class Meta(ModuleSerializer.Meta):
+        fields = ["id", "title", "order", "module_contents"]
+
+
+
+class CourseOutlineSerializer(CourseSerializer):
+    """A course together with its ordered modules and their contents."""
+
+    modules = OutlineModuleSerializer(many=True, read_only=True)
+
+    class Meta(CourseSerializer.Meta):
+        fields = CourseSerializer.Meta.fields + ["modules"]
+
+
 class CourseEnrollmentSerializer(serializers.ModelSerializer):
     """Handles student enrollments in a course"""
 
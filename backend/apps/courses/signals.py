@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.base.cache import CATALOG, bump_versions, course_scope
+from .models import Course, Module, ModuleContent
+from .search import get_search_backend
+
+User = get_user_model()
+
+
+def bump_instructor_courses(instructor_id):
+    """Invalidate the catalog and every course that embeds this instructor."""
+    course_ids = Course.objects.filter(instructor_id=instructor_id).values_list(
+        "id", flat=True
+    )
+    bump_versions(CATALOG, *(course_scope(course_id) for course_id in course_ids))
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def reindex_module_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index([instance.course_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    # The instructor's course count is part of all of their courses.
+    bump_instructor_courses(instance.instructor_id)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_module_course(sender, instance, **kwargs):
+    bump_versions(CATALOG, course_scope(instance.course_id))
+
+
+@receiver(post_save, sender=ModuleContent)
+@receiver(post_delete, sender=ModuleContent)
+def invalidate_module_content_course(sender, instance, **kwargs):
+    course_id = Module.objects.filter(pk=instance.module_id).values_list(
+        "course_id", flat=True
+    ).first()
+    bump_versions(CATALOG, course_scope(course_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_profile(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    # Profiles are embedded as the instructor of courses and as the author
+    # of course feedback.
+    bump_instructor_courses(instance.pk)
+    reviewed = instance.course_feedbacks.values_list("course_id", flat=True)
+    bump_versions(*(course_scope(course_id) for course_id in reviewed))
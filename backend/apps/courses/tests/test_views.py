@@ -1,5 +1,9 @@
 from .test_setup import TestSetUp
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from apps.courses.models import Course, CourseEnrollment, Module, ModuleContent
+from apps.courses.access import CourseAccess
 
 
 class TestViews(TestSetUp):
@@ -192,3 +196,253 @@ class TestViews(TestSetUp):
         self.assertEqual(
             res.data["results"][0]["id"], enrollment_res.data["enrollment_id"]
         )
+
+    def test_course_list_query_count_does_not_grow_with_page_size(self):
+        user, course = self.create_course()
+        student = self.create_user(True)
+        CourseEnrollment.objects.create(student=student, course=course)
+        access_token = self.get_token(student)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+
+        # Warm the principal cache so both requests authenticate alike.
+        self.client.get(self.course_list_create_url)
+        with CaptureQueriesContext(connection) as single_page:
+            self.client.get(self.course_list_create_url)
+        for i in range(5):
+            Course.objects.create(
+                title=f"Course {i}", description="More courses", instructor=user
+            )
+        with CaptureQueriesContext(connection) as full_page:
+            res = self.client.get(self.course_list_create_url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(full_page), len(single_page))
+        enrolled = [c for c in res.data["results"] if c["id"] == course.id][0]
+        self.assertTrue(enrolled["has_enrolled"])
+        self.assertFalse(enrolled["is_blocked"])
+        self.assertEqual(enrolled["instructor"]["total_course"], 6)
+
+    def test_course_search_keeps_listing_info(self):
+        self.create_course()
+        res = self.client.get(self.course_list_create_url, {"search": "web html"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertFalse(res.data["results"][0]["has_enrolled"])
+
+    def test_course_search_ranks_prefix_and_module_matches(self):
+        user, course = self.create_course()
+        in_title = Course.objects.create(
+            title="Javascript Deep Dive", description="Closures.", instructor=user
+        )
+        self.create_module(Course.objects.create(
+            title="Frontend", description="Build pages.", instructor=user
+        ))
+        module_course = self.module_data["course"]
+
+        res = self.client.get(self.course_list_create_url, {"search": "javas"})
+        ids = [result["id"] for result in res.data["results"]]
+        # The title match outranks the description-only match.
+        self.assertEqual(ids, [in_title.id, course.id])
+
+        res = self.client.get(self.course_list_create_url, {"search": "html"})
+        ids = {result["id"] for result in res.data["results"]}
+        self.assertEqual(ids, {course.id, module_course.id})
+
+        module_course.delete()
+        res = self.client.get(self.course_list_create_url, {"search": "html"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [course.id])
+
+    def test_course_outline_uses_fixed_number_of_queries(self):
+        user, course = self.create_course()
+        access_token = self.get_token(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        outline_url = reverse("course-outline", kwargs={"pk": course.id})
+
+        first = Module.objects.create(course=course, title="Second", order=2)
+        ModuleContent.objects.create(module=first, content_type="text", text="b", order=2)
+        ModuleContent.objects.create(module=first, content_type="text", text="a", order=1)
+        self.client.get(outline_url)
+        with CaptureQueriesContext(connection) as one_module:
+            self.client.get(outline_url)
+        Module.objects.create(course=course, title="First", order=1)
+        for i in range(3):
+            module = Module.objects.create(course=course, title=f"Extra {i}", order=3 + i)
+            ModuleContent.objects.create(module=module, content_type="text", text="c")
+        with CaptureQueriesContext(connection) as many_modules:
+            res = self.client.get(outline_url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(many_modules), len(one_module))
+        modules = res.data["modules"]
+        self.assertEqual([m["title"] for m in modules[:2]], ["First", "Second"])
+        self.assertEqual([c["text"] for c in modules[1]["module_contents"]], ["a", "b"])
+
+    def test_course_outline_hides_contents_from_outsiders(self):
+        user, course = self.create_course()
+        module = self.create_module(course)
+        self.create_module_content(module)
+        res = self.client.get(reverse("course-outline", kwargs={"pk": course.id}))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["modules"][0]["module_contents"], [])
+
+    def test_course_access_is_loaded_with_one_query(self):
+        user, course = self.create_course()
+        student = self.create_user(True)
+        other = Course.objects.create(title="Other", description="x", instructor=student)
+        CourseEnrollment.objects.create(student=student, course=course, is_blocked=True)
+        access = CourseAccess(student)
+        with self.assertNumQueries(1):
+            self.assertTrue(access.is_enrolled(course.id))
+            self.assertTrue(access.is_blocked(course.id))
+            self.assertFalse(access.is_instructor(course.id))
+            self.assertTrue(access.is_instructor(other.id))
+            self.assertFalse(access.is_enrolled(other.id))
+
+    def test_module_list_query_count_does_not_grow_with_modules(self):
+        user, course = self.create_course()
+        access_token = self.get_token(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        self.create_module_content(self.create_module(course))
+        self.client.get(self.module_list_create_url)
+        with CaptureQueriesContext(connection) as one_module:
+            self.client.get(self.module_list_create_url)
+        for i in range(3):
+            module = Module.objects.create(course=course, title=f"Module {i}")
+            ModuleContent.objects.create(module=module, content_type="text", text="x")
+        with CaptureQueriesContext(connection) as many_modules:
+            res = self.client.get(self.module_list_create_url)
+        self.assertEqual(len(many_modules), len(one_module))
+        self.assertTrue(all(m["module_contents"] for m in res.data["results"]))
+
+    def test_anonymous_course_list_is_served_from_cache_until_a_write(self):
+        user, course = self.create_course()
+        res = self.client.get(self.course_list_create_url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        res = self.client.get(self.course_list_create_url)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(len(res.data["results"]), 1)
+
+        Course.objects.create(title="Another", description="x", instructor=user)
+        res = self.client.get(self.course_list_create_url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 2)
+
+        detail_url = reverse("course-detail", kwargs={"pk": course.id})
+        self.client.get(detail_url)
+        self.assertEqual(self.client.get(detail_url)["X-Cache"], "HIT")
+        self.create_module(course)
+        self.assertEqual(self.client.get(detail_url)["X-Cache"], "MISS")
+
+    def test_authenticated_course_list_bypasses_cache(self):
+        user, course = self.create_course()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.get_token(user)}")
+        self.client.get(self.course_list_create_url)
+        res = self.client.get(self.course_list_create_url)
+        self.assertNotIn("X-Cache", res)
+        self.assertTrue(res.data["results"][0]["has_enrolled"])
+
+    def test_course_detail_and_list_support_conditional_get(self):
+        user, course = self.create_course()
+        detail_url = reverse("course-detail", kwargs={"pk": course.id})
+        etag = self.client.get(detail_url)["ETag"]
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        list_etag = self.client.get(self.course_list_create_url)["ETag"]
+        self.assertTrue(list_etag.startswith("W/"))
+        self.assertEqual(
+            self.client.get(
+                self.course_list_create_url, HTTP_IF_NONE_MATCH=list_etag
+            ).status_code,
+            304,
+        )
+
+        # A new course of the same instructor changes their course count.
+        Course.objects.create(title="Another", description="x", instructor=user)
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get(
+                self.course_list_create_url, HTTP_IF_NONE_MATCH=list_etag
+            ).status_code,
+            200,
+        )
+
+    def test_module_detail_etag_follows_contents(self):
+        user, course = self.create_course()
+        module = self.create_module(course)
+        detail_url = reverse("module-detail", kwargs={"pk": module.id})
+        etag = self.client.get(detail_url)["ETag"]
+        self.create_module_content(module)
+        res = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 304
+        )
+
+    def test_module_etag_changes_when_user_enrolls(self):
+        user, course = self.create_course()
+        module = self.create_module(course)
+        self.create_module_content(module)
+        student = self.create_user(second=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.get_token(student)}")
+        detail_url = reverse("module-detail", kwargs={"pk": module.id})
+        etag = self.client.get(detail_url)["ETag"]
+        list_res = self.client.get(self.module_list_create_url)
+        self.assertNotIn("Last-Modified", list_res)
+
+        self.client.post(reverse("enroll-course", kwargs={"course_id": course.id}))
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get(
+                self.module_list_create_url, HTTP_IF_NONE_MATCH=list_res["ETag"]
+            ).status_code,
+            200,
+        )
+
+    def test_course_list_orders_only_by_allowed_fields(self):
+        user, course = self.create_course()
+        Course.objects.create(
+            title="Rated", description="x", instructor=user, rating_avg=4.5
+        )
+        res = self.client.get(self.course_list_create_url, {"order_by": "-rating_avg"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["title"], "Rated")
+        for field in ("instructor__password", "no_such_field"):
+            res = self.client.get(self.course_list_create_url, {"order_by": field})
+            self.assertEqual(res.status_code, 400)
+
+    def test_course_search_combines_with_other_filters(self):
+        user, course = self.create_course()
+        other = self.create_user(second=True)
+        for i in range(3):
+            Course.objects.create(title=f"Python {i}", description="x", instructor=user)
+        theirs = Course.objects.create(
+            title="Python Basics", description="x", instructor=other, rating_avg=4
+        )
+        res = self.client.get(
+            self.course_list_create_url, {"search": "python", "teacher": other.id}
+        )
+        self.assertEqual([r["id"] for r in res.data["results"]], [theirs.id])
+        res = self.client.get(
+            self.course_list_create_url, {"search": "python", "min_rating": 3}
+        )
+        self.assertEqual([r["id"] for r in res.data["results"]], [theirs.id])
+        res = self.client.get(self.course_list_create_url, {"search": "python"})
+        self.assertEqual(len(res.data["results"]), 4)
+
+    def test_anonymous_cache_hits_answer_conditional_gets_without_queries(self):
+        user, course = self.create_course()
+        detail_url = reverse("course-detail", kwargs={"pk": course.id})
+        for url, query in ((self.course_list_create_url, {"search": "web"}), (detail_url, {})):
+            first = self.client.get(url, query)
+            with self.assertNumQueries(0):
+                res = self.client.get(url, query)
+            self.assertEqual((res["X-Cache"], res["ETag"]), ("HIT", first["ETag"]))
+            with self.assertNumQueries(0):
+                res = self.client.get(url, query, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["Last-Modified"], first["Last-Modified"])
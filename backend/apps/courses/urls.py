@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     CourseListCreateView,
     CourseDetailView,
+    CourseOutlineView,
     ModuleListCreateView,
     ModuleDetailView,
     ModuleContentListCreateView,
@@ -15,6 +16,9 @@ urlpatterns = [
     # Course URLs
     path("courses/", CourseListCreateView.as_view(), name="course-list-create"),
     path("courses/<int:pk>/", CourseDetailView.as_view(), name="course-detail"),
+    path(
+        "courses/<int:pk>/outline/", CourseOutlineView.as_view(), name="course-outline"
+    ),
     # Module URLs
     path("modules/", ModuleListCreateView.as_view(), name="module-list-create"),
     path("modules/<int:pk>/", ModuleDetailView.as_view(), name="module-detail"),
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -8,13 +9,35 @@ from .serializers import (
     ModuleSerializer,
     ModuleContentSerializer,
     CourseEnrollmentSerializer,
+    CourseOutlineSerializer,
 )
 from rest_framework import serializers
 from .filters import CourseFilter, ModuleFilter, CourseEnrollmentFilter
 from .tasks import notify_teacher
+from .access import CourseAccessMixin, get_course_access
+from apps.base.cache import CachedResponseMixin, course_scope
+from apps.base.conditional import ConditionalGetMixin
 
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseETagMixin(ConditionalGetMixin):
+    """
+    For payloads that depend on the user's enrollment state: course
+    listings, and modules whose contents only members may see.
+    """
+
+    etag_related = ("instructor",)
+
+    def get_etag_salt(self):
+        access = get_course_access(self.request)
+        return super().get_etag_salt() + [
+            sorted(access.enrolled_course_ids),
+            sorted(access.blocked_course_ids),
+        ]
+
+
+class CourseListCreateView(
+    CachedResponseMixin, CourseETagMixin, CourseAccessMixin, generics.ListCreateAPIView
+):
     """Handles listing all courses & creating a new course"""
 
     queryset = Course.objects.all()
@@ -22,33 +45,86 @@ class CourseListCreateView(generics.ListCreateAPIView):
     filterset_class = CourseFilter
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return super().get_queryset().with_listing_info()
+
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(
+    CachedResponseMixin,
+    CourseETagMixin,
+    CourseAccessMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     """Handles retrieving, updating, and deleting a course"""
 
+    etag_related = ("instructor", "instructor__courses_created")
+
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return super().get_queryset().with_listing_info()
+
+    def get_cache_scopes(self):
+        return [course_scope(self.kwargs["pk"])]
+
+
+class CourseOutlineView(CourseAccessMixin, generics.RetrieveAPIView):
+    """
+    Returns a course with its ordered modules and their ordered contents.
+    Contents are only included for the instructor and enrolled students.
+    """
+
+    queryset = Course.objects.all()
+    serializer_class = CourseOutlineSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        modules = Module.objects.order_by("order", "id")
+        if self.can_view_contents():
+            modules = modules.prefetch_related(
+                Prefetch("contents", queryset=ModuleContent.objects.order_by("order", "id"))
+            )
+        return (
+            super()
+            .get_queryset()
+            .with_listing_info()
+            .prefetch_related(Prefetch("modules", queryset=modules))
+        )
+
+    def can_view_contents(self):
+        return get_course_access(self.request).can_view_contents(self.kwargs["pk"])
 
-class ModuleListCreateView(generics.ListCreateAPIView):
+
+class ModuleListCreateView(
+    CourseETagMixin, CourseAccessMixin, generics.ListCreateAPIView
+):
     """Handles adding modules to a course"""
 
-    queryset = Module.objects.all()
+    etag_related = ("contents",)
+
+    queryset = Module.objects.prefetch_related(
+        Prefetch("contents", queryset=ModuleContent.objects.order_by("order", "id"))
+    )
     serializer_class = ModuleSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_class = ModuleFilter
 
 
-class ModuleDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ModuleDetailView(
+    CourseETagMixin, CourseAccessMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """Handles updating or deleting a module"""
 
+    etag_related = ("contents",)
+
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class ModuleContentListCreateView(generics.ListCreateAPIView):
+class ModuleContentListCreateView(CourseAccessMixin, generics.ListCreateAPIView):
     """Handles adding content to a module"""
 
     queryset = ModuleContent.objects.all()
@@ -56,10 +132,10 @@ class ModuleContentListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class ModuleContentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ModuleContentDetailView(CourseAccessMixin, generics.RetrieveUpdateDestroyAPIView):
     """Handles updating or deleting a module content"""
 
-    queryset = ModuleContent.objects.all()
+    queryset = ModuleContent.objects.select_related("module")
     serializer_class = ModuleContentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -77,9 +153,7 @@ class EnrollInCourseView(APIView):
             raise ValidationError({"course_id": "Course not found."})
 
         # Check if already enrolled
-        if CourseEnrollment.objects.filter(
-            student=request.user, course=course
-        ).exists():
+        if get_course_access(request).is_enrolled(course.id):
             raise ValidationError(
                 {"message": "You are already enrolled in this course."}
             )
@@ -104,20 +178,23 @@ class EnrolledStudentView(generics.ListAPIView):
     serializer_class = CourseEnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_class = CourseEnrollmentFilter
+    keyset_ordering = ("-created_at", "-id")
 
     def get_queryset(self):
         qs = super().get_queryset()
         return qs.filter(course__instructor=self.request.user)
     
 
-class BlockEnrolledStudentView(generics.RetrieveUpdateDestroyAPIView):
+class BlockEnrolledStudentView(
+    CourseAccessMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = CourseEnrollment.objects.all()
     serializer_class = CourseEnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         obj = super().get_object()
-        if obj.course.instructor != self.request.user:
+        if not get_course_access(self.request).is_instructor(obj.course_id):
             raise serializers.ValidationError(
                 {"message": "You don't have permissions to perform this action."}
             )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.feedback.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored course and instructor rating aggregates from scratch."
+
+    def handle(self, *args, **options):
+        courses, instructors = rebuild_rating_aggregates()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt ratings for {courses} course(s) and {instructors} instructor(s)."
+            )
+        )
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_enrollment_keyset_index'),
+        ('feedback', '0003_feedback_rating_range'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coursefeedback',
+            index=models.Index(fields=['created_at', 'id'], name='feedback_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursefeedback',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='feedback_course_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statusupdate',
+            index=models.Index(fields=['created_at', 'id'], name='status_update_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statusupdate',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='status_update_user_ts_idx'),
+        ),
+    ]
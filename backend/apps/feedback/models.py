@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth import get_user_model
 from apps.base.models import BaseModelWithoutID
 
@@ -17,9 +18,19 @@ class CourseFeedback(BaseModelWithoutID):
     student = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="course_feedbacks"
     )
-    rating = models.PositiveSmallIntegerField(default=5)
+    rating = models.PositiveSmallIntegerField(
+        default=5, validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
     comment = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="feedback_ts_idx"),
+            models.Index(
+                fields=["course", "created_at", "id"], name="feedback_course_ts_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Feedback on '{self.course.title}' by {self.student.email}"
 
@@ -34,6 +45,14 @@ class StatusUpdate(BaseModelWithoutID):
     )
     content = models.TextField(help_text="Content of the status update")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="status_update_ts_idx"),
+            models.Index(
+                fields=["user", "created_at", "id"], name="status_update_user_ts_idx"
+            ),
+        ]
+
     def __str__(self):
         return (
             f"Status update by {self.user.email} at {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,115 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+from apps.courses.models import Course
+from backend.custom_authentication import principal_cache
+
+User = get_user_model()
+
+STARS = range(1, 6)
+
+
+def _shifted(field, delta):
+    return F(field) + delta
+
+
+def apply_rating_change(course_id, added=None, removed=None):
+    """
+    Shift the stored rating aggregates of a course and its instructor.
+
+    `added` is the rating a feedback now holds, `removed` the rating it held
+    before; either may be None for a create or a delete. Every column is
+    updated with F() expressions so concurrent feedback writes never lose an
+    increment. updated_at moves along so HTTP validators see the change.
+    """
+    if added == removed:
+        return
+    sum_delta = (added or 0) - (removed or 0)
+    count_delta = (added is not None) - (removed is not None)
+
+    now = timezone.now()
+    course_updates = {
+        "updated_at": now,
+        "rating_sum": _shifted("rating_sum", sum_delta),
+        "rating_count": _shifted("rating_count", count_delta),
+        # SQL evaluates the whole SET list against the old row, so the deltas
+        # are applied again here instead of reading the new columns.
+        "rating_avg": Coalesce(
+            Cast(_shifted("rating_sum", sum_delta), FloatField())
+            / NullIf(_shifted("rating_count", count_delta), 0),
+            Value(0.0),
+        ),
+    }
+    if added in STARS:
+        course_updates[f"rating_{added}"] = _shifted(f"rating_{added}", 1)
+    if removed in STARS:
+        course_updates[f"rating_{removed}"] = _shifted(f"rating_{removed}", -1)
+
+    instructor_id = (
+        Course.objects.filter(pk=course_id).values_list("instructor_id", flat=True).first()
+    )
+    with transaction.atomic():
+        Course.objects.filter(pk=course_id).update(**course_updates)
+        User.objects.filter(pk=instructor_id).update(
+            updated_at=now,
+            rating_sum=_shifted("rating_sum", sum_delta),
+            rating_count=_shifted("rating_count", count_delta),
+        )
+    # Queryset updates skip the signals that keep cached principals fresh.
+    principal_cache.invalidate(instructor_id)
+
+
+def rebuild_rating_aggregates(apps=global_apps):
+    """
+    Recompute every stored rating aggregate from CourseFeedback. Migrations
+    pass their own app registry so the historical models are used.
+    """
+    Course = apps.get_model("courses", "Course")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    CourseFeedback = apps.get_model("feedback", "CourseFeedback")
+
+    course_fields = ["rating_sum", "rating_count", "rating_avg"] + [
+        f"rating_{star}" for star in STARS
+    ]
+    with transaction.atomic():
+        Course.objects.update(**{field: 0 for field in course_fields})
+        User.objects.update(rating_sum=0, rating_count=0)
+
+        course_rows = CourseFeedback.objects.values("course").annotate(
+            total=Sum("rating"),
+            count=Count("id"),
+            **{f"star_{star}": Count("id", filter=Q(rating=star)) for star in STARS},
+        )
+        courses = []
+        for row in course_rows:
+            course = Course(
+                id=row["course"],
+                rating_sum=row["total"],
+                rating_count=row["count"],
+                rating_avg=row["total"] / row["count"],
+            )
+            for star in STARS:
+                setattr(course, f"rating_{star}", row[f"star_{star}"])
+            courses.append(course)
+        Course.objects.bulk_update(courses, course_fields, batch_size=500)
+
+        instructor_rows = CourseFeedback.objects.values("course__instructor").annotate(
+            total=Sum("rating"), count=Count("id")
+        )
+        instructors = [
+            User(
+                id=row["course__instructor"],
+                rating_sum=row["total"],
+                rating_count=row["count"],
+            )
+            for row in instructor_rows
+        ]
+        User.objects.bulk_update(
+            instructors, ["rating_sum", "rating_count"], batch_size=500
+        )
+    principal_cache.clear()
+    return len(courses), len(instructors)
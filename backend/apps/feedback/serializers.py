@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import CourseFeedback, StatusUpdate
+from .ratings import apply_rating_change
 from apps.users.serializers import ProfileSerializer
+from apps.courses.access import course_access_from_context
 
 class CourseFeedbackSerializer(serializers.ModelSerializer):
     # student is read-only: it will be set automatically from request.user.
@@ -21,16 +24,19 @@ class CourseFeedbackSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context["request"].user
-        if not user.enrolled_courses.filter(course=validated_data["course"]).exists():
+        access = course_access_from_context(self.context)
+        if not access.is_enrolled(validated_data["course"].id):
             raise serializers.ValidationError(
                 "Only students can leave feedback on courses."
             )
-        feedback =  user.course_feedbacks.filter(course=validated_data["course"])
-        if feedback.exists():
-            feedback.update(**validated_data)
-            return feedback.first()
+        feedback = user.course_feedbacks.filter(course=validated_data["course"]).first()
+        if feedback:
+            return self.update(feedback, validated_data)
         validated_data["student"] = user
-        return super().create(validated_data)
+        # The post_save receiver shifts the rating aggregates in the same
+        # transaction.
+        with transaction.atomic():
+            return super().create(validated_data)
 
     def update(self, instance, validated_data):
         user = self.context["request"].user
@@ -38,7 +44,17 @@ class CourseFeedbackSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "You don't have permissions to update other's feedback."
             )
-        return super().update(instance, validated_data)
+        old_course_id, old_rating = instance.course_id, instance.rating
+        with transaction.atomic():
+            feedback = super().update(instance, validated_data)
+            if feedback.course_id != old_course_id:
+                apply_rating_change(old_course_id, removed=old_rating)
+                apply_rating_change(feedback.course_id, added=feedback.rating)
+            else:
+                apply_rating_change(
+                    feedback.course_id, added=feedback.rating, removed=old_rating
+                )
+        return feedback
 
 
 class StatusUpdateSerializer(serializers.ModelSerializer):
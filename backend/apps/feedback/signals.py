@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.courses.models import Course
+from apps.courses.signals import bump_instructor_courses
+from .models import CourseFeedback
+from .ratings import apply_rating_change
+
+
+@receiver(post_save, sender=CourseFeedback)
+def add_feedback_rating(sender, instance, created, **kwargs):
+    # Rating changes of existing feedback are shifted by the serializer,
+    # which knows the old value.
+    if created:
+        apply_rating_change(instance.course_id, added=instance.rating)
+
+
+@receiver(post_delete, sender=CourseFeedback)
+def remove_feedback_rating(sender, instance, **kwargs):
+    apply_rating_change(instance.course_id, removed=instance.rating)
+
+
+@receiver(post_save, sender=CourseFeedback)
+@receiver(post_delete, sender=CourseFeedback)
+def invalidate_feedback_course(sender, instance, **kwargs):
+    # The rating feeds the course and the instructor profile of every one of
+    # the instructor's courses.
+    instructor_id = Course.objects.filter(pk=instance.course_id).values_list(
+        "instructor_id", flat=True
+    ).first()
+    bump_instructor_courses(instructor_id)
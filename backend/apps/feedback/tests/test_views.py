@@ -1,3 +1,5 @@
+from io import StringIO
+from django.core.management import call_command
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
@@ -57,6 +59,42 @@ class CourseFeedbackTests(TestSetUp):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(CourseFeedback.objects.count(), 0)
 
+    def test_course_rating_aggregates_follow_feedback_writes(self):
+        self.enroll_student(self.student, self.course)
+        self.client.force_authenticate(user=self.student)
+        data = {'course': self.course.id, 'comment': 'Good', 'rating': 4}
+        response = self.client.post(self.course_feedback_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.course.refresh_from_db()
+        self.teacher.refresh_from_db()
+        self.assertEqual((self.course.rating_sum, self.course.rating_count), (4, 1))
+        self.assertEqual(self.course.rating_avg, 4)
+        self.assertEqual(self.course.rating_4, 1)
+        self.assertEqual(self.teacher.avg_rating, 4)
+
+        # Posting again replaces the student's rating instead of adding one.
+        data['rating'] = 2
+        self.client.post(self.course_feedback_url, data, format='json')
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.rating_sum, self.course.rating_count), (2, 1))
+        self.assertEqual((self.course.rating_4, self.course.rating_2), (0, 1))
+
+        feedback = CourseFeedback.objects.get()
+        self.client.delete(reverse('feedback-detail', kwargs={'pk': feedback.pk}))
+        self.course.refresh_from_db()
+        self.teacher.refresh_from_db()
+        self.assertEqual((self.course.rating_sum, self.course.rating_count), (0, 0))
+        self.assertEqual(self.course.rating_avg, 0)
+        self.assertEqual(self.teacher.rating_count, 0)
+
+    def test_rebuild_ratings_command(self):
+        CourseFeedback.objects.create(**self.course_feedback_data)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.course.refresh_from_db()
+        self.teacher.refresh_from_db()
+        self.assertEqual((self.course.rating_sum, self.course.rating_count), (5, 1))
+        self.assertEqual(self.course.rating_5, 1)
+        self.assertEqual(self.teacher.rating_sum, 5)
 
 
 class StatusUpdateTests(APITestCase):
@@ -2,8 +2,16 @@ from rest_framework import generics, permissions
 from .models import CourseFeedback, StatusUpdate
 from .serializers import CourseFeedbackSerializer, StatusUpdateSerializer
 from .filters import CourseFeedbackFilter, StatusUpdateFilter
+from apps.courses.access import CourseAccessMixin
+from apps.base.cache import CachedResponseMixin, course_scope
+from apps.base.conditional import ConditionalGetMixin
 
-class CourseFeedbackListCreateView(generics.ListCreateAPIView):
+class CourseFeedbackListCreateView(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    CourseAccessMixin,
+    generics.ListCreateAPIView,
+):
     """
     API view to list all feedback for a course and allow a student to create new feedback.
     If a 'course' query parameter is provided, the list is filtered by that course.
@@ -13,9 +21,19 @@ class CourseFeedbackListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = CourseFeedback.objects.all()
     filterset_class = CourseFeedbackFilter
+    keyset_ordering = ("-created_at", "-id")
+    etag_related = ("student",)
 
+    def get_cache_scopes(self):
+        course_id = self.request.query_params.get("course")
+        if course_id and course_id.isdigit():
+            return [course_scope(int(course_id))]
+        return super().get_cache_scopes()
 
-class CourseFeedbackDetailView(generics.RetrieveUpdateDestroyAPIView):
+
+class CourseFeedbackDetailView(
+    CourseAccessMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """
     API view to retrieve, update, or delete a specific feedback.
     Only the student who created the feedback can update or delete it.
@@ -35,6 +53,7 @@ class StatusUpdateListCreateView(generics.ListCreateAPIView):
     serializer_class = StatusUpdateSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_class = StatusUpdateFilter
+    keyset_ordering = ("-created_at", "-id")
 
 
 class StatusUpdateDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -0,0 +1,113 @@
+"""
+Write-behind tracking of when users were last active.
+
+Authentication only records a timestamp in memory. Timestamps are coalesced
+per user to one per USER_ACTIVITY_GRANULARITY seconds, and a daemon thread
+writes the pending ones every USER_ACTIVITY_FLUSH_INTERVAL seconds with a
+single bulk_update, so authenticated reads never write to the database.
+"""
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    def __init__(self, granularity=None, flush_interval=None):
+        self._granularity = granularity
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._buckets = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def granularity(self):
+        if self._granularity is None:
+            return getattr(settings, "USER_ACTIVITY_GRANULARITY", 60)
+        return self._granularity
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is None:
+            return getattr(settings, "USER_ACTIVITY_FLUSH_INTERVAL", 30)
+        return self._flush_interval
+
+    def touch(self, user_id, now=None):
+        """Record activity; returns False if it falls in an already seen bucket."""
+        now = now or timezone.now()
+        bucket = int(now.timestamp() // max(self.granularity, 1))
+        with self._lock:
+            if self._buckets.get(user_id) == bucket:
+                return False
+            self._buckets[user_id] = bucket
+            self._pending[user_id] = now
+        self._ensure_flusher()
+        return True
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write every pending timestamp; returns how many users were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Only the buckets of users written now are worth remembering.
+            self._buckets = {
+                user_id: bucket
+                for user_id, bucket in self._buckets.items()
+                if user_id in pending
+            }
+        if not pending:
+            return 0
+        User = get_user_model()
+        users = [
+            User(pk=user_id, last_active_on=seen) for user_id, seen in pending.items()
+        ]
+        try:
+            # last_active_on is not among the fields cached principals hold.
+            User.objects.bulk_update(users, ["last_active_on"], batch_size=500)
+        except Exception:
+            # Keep the timestamps for the next round unless newer ones came in.
+            with self._lock:
+                for user_id, seen in pending.items():
+                    self._pending.setdefault(user_id, seen)
+            raise
+        return len(users)
+
+    def _ensure_flusher(self):
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="user-activity-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush user activity")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not flush user activity on shutdown")
+
+
+tracker = ActivityTracker()
+atexit.register(tracker.stop)
@@ -6,4 +6,4 @@ from .models import User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ["id", "email", "created_at", "updated_at"]
+    list_display = ["id", "email", "created_at", "updated_at", "last_active_on"]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='last_active_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -31,6 +31,12 @@ class User(BaseModelWithoutID, AbstractBaseUser, PermissionsMixin):
     verification_token = models.UUIDField(blank=True, null=True)
     is_staff = models.BooleanField(default=False)
     is_teacher = models.BooleanField(default=False)
+    # Written in batches by apps.users.activity, at most once per
+    # USER_ACTIVITY_GRANULARITY seconds.
+    last_active_on = models.DateTimeField(null=True, blank=True)
+    # Rating aggregates over the feedback of every course the user teaches.
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = "email"
 
@@ -38,6 +44,7 @@ class User(BaseModelWithoutID, AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         db_table = f"{settings.DB_PREFIX}user"
+        indexes = [models.Index(fields=["created_at", "id"], name="user_created_ts_idx")]
 
     @property
     def is_admin(self):
@@ -46,6 +53,10 @@ class User(BaseModelWithoutID, AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return str(self.id)
 
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
     @property
     def is_email_verified(self):
         return False if self.verification_token else True
@@ -8,8 +8,6 @@ from apps.base.utils import generate_random_number
 from django.utils.encoding import smart_str, DjangoUnicodeDecodeError
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from apps.feedback.models import CourseFeedback
-from django.db.models import Avg
 
 User = get_user_model()
 
@@ -118,7 +116,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.set_password(self.validated_data["new_password"])
         # chaning the secret key upon changing the password for extra security.
         user.secret_key = generate_random_number()
-        user.save()
+        user.save(update_fields=["password", "secret_key", "updated_at"])
         payload = {
             "user_id": str(user.id),
             "secret_key": user.secret_key,
@@ -191,10 +189,9 @@ class ProfileSerializer(serializers.ModelSerializer):
         extra_kwargs = {"email": {"read_only": True}}
 
     def get_total_course(self, obj):
+        if hasattr(obj, "total_course_count"):
+            return obj.total_course_count
         return obj.courses_created.count()
 
     def get_avg_rating(self, obj):
-        avg_rating = CourseFeedback.objects.filter(course__instructor_id=obj.id).aggregate(
-            Avg("rating")
-        )["rating__avg"]
-        return avg_rating if avg_rating else 1
+        return obj.avg_rating or 1
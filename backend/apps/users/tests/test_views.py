@@ -1,3 +1,9 @@
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from apps.users.activity import ActivityTracker
+from backend.custom_authentication import principal_cache
 from .test_setup import TestSetUp
 
 
@@ -51,3 +57,85 @@ class TestViews(TestSetUp):
         res = self.client.get(self.users_url)
         self.assertEqual(res.status_code, 200)
         self.assertEqual(res.data["results"][0]["email"], user.email)
+
+    def test_profile_supports_conditional_get(self):
+        user = self.create_user()
+        access_token = self.get_token(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        res = self.client.get(self.profile_url)
+        self.assertEqual(res.status_code, 200)
+        etag = res["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertIn("Last-Modified", res)
+
+        res = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        self.client.patch(self.profile_url, {"bio": "Changed"}, format="json")
+        res = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_token_authentication_does_not_write(self):
+        user = self.create_user()
+        access_token = self.get_token(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.profile_url)
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(
+            [q for q in queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+        )
+
+    def test_activity_tracker_coalesces_and_batches(self):
+        user = self.create_user()
+        updated_at = user.updated_at
+        tracker = ActivityTracker(granularity=60, flush_interval=0)
+        now = timezone.now().replace(second=0, microsecond=0)
+        self.assertTrue(tracker.touch(user.id, now))
+        self.assertFalse(tracker.touch(user.id, now + timedelta(seconds=30)))
+        self.assertEqual(tracker.pending_count(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(tracker.flush(), 1)
+        user.refresh_from_db()
+        self.assertEqual(user.last_active_on, now)
+        self.assertEqual(user.updated_at, updated_at)
+        self.assertTrue(tracker.touch(user.id, now + timedelta(seconds=61)))
+
+    def test_authenticated_user_is_cached_until_secret_key_changes(self):
+        user = self.create_user()
+        access_token = self.get_token(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        principal_cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.users_url)
+        with CaptureQueriesContext(connection) as warm:
+            res = self.client.get(self.users_url)
+        self.assertEqual(res.status_code, 200)
+        # Only the lookup of the user behind the token is saved.
+        self.assertEqual(len(warm), len(cold) - 1)
+
+        data = {
+            "old_password": self.user_data["password"],
+            "new_password": "NewSecurePass432",
+            "confirm_new_password": "NewSecurePass432",
+        }
+        res = self.client.post(self.change_password_url, data, format="json")
+        self.assertEqual(res.status_code, 200)
+        res = self.client.get(self.profile_url)
+        self.assertEqual(res.status_code, 401)
+
+    def test_cached_principal_does_not_overwrite_newer_fields(self):
+        user = self.create_user()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.get_token(user)}")
+        principal_cache.clear()
+        self.client.get(self.users_url)
+        # A queryset update, like a new review of the user's course.
+        type(user).objects.filter(pk=user.pk).update(rating_sum=4, rating_count=1)
+
+        res = self.client.patch(self.profile_url, {"bio": "Changed"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["avg_rating"], 4)
+        user.refresh_from_db()
+        self.assertEqual((user.bio, user.rating_sum, user.rating_count), ("Changed", 4, 1))
@@ -19,6 +19,7 @@ from django.utils.http import urlsafe_base64_encode
 from .tasks import send_password_reset_email_on_delay, send_verification_mail_on_delay
 from .filters import UserFilter
 from backend.custom_authentication import TokenManager
+from apps.base.conditional import ConditionalGetMixin
 
 User = get_user_model()
 
@@ -85,12 +86,21 @@ class PasswordResetView(APIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
 
-class ProfileUpdateView(RetrieveUpdateAPIView):
+class ProfileUpdateView(ConditionalGetMixin, RetrieveUpdateAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
+    etag_related = ("courses_created",)
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the principal cache; read and save the
+        # current row instead.
+        return User.objects.get(pk=self.request.user.pk)
+
+    def is_detail_request(self):
+        return True
+
+    def get_validator_queryset(self):
+        return User.objects.filter(pk=self.request.user.pk)
 
 
 @api_view(["POST"])
@@ -128,6 +138,7 @@ class UserListView(ListAPIView):
     queryset = User.objects.all()
     filterset_class = UserFilter
     permission_classes = [AllowAny]
+    keyset_ordering = ("-created_at", "-id")
 
 
 
@@ -1,8 +1,11 @@
+import threading
+import time
+from collections import OrderedDict
 import jwt
 from django.conf import settings
-from django.utils import timezone
 from rest_framework import authentication, exceptions
 from apps.users.models import User
+from apps.users.activity import tracker as activity_tracker
 
 
 class TokenManager:
@@ -42,6 +45,115 @@ class TokenManager:
         return TokenManager.get_token(payload)
 
 
+class PrincipalCache:
+    """
+    A small TTL + LRU cache of authenticated users, keyed by (user_id, secret_key).
+
+    Entries hold only `fields`, what authentication and permission checks
+    read; every other field of a cached user is deferred and loaded from the
+    database on first access, and saving such a user writes back only the
+    fields it loaded. Saving or deleting a user drops their entry in this
+    process, and rotating the secret key changes the key itself; other
+    processes catch up within AUTH_PRINCIPAL_CACHE_TTL seconds. Code that
+    changes users with queryset updates must call `invalidate()` itself.
+    """
+
+    fields = (
+        "id", "email", "name", "secret_key",
+        "is_staff", "is_superuser", "is_teacher", "is_deleted",
+    )
+
+    def __init__(self, ttl=None, max_size=None):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return getattr(settings, "AUTH_PRINCIPAL_CACHE_TTL", 60)
+        return self._ttl
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return getattr(settings, "AUTH_PRINCIPAL_CACHE_SIZE", 10000)
+        return self._max_size
+
+    def get(self, user_id, secret_key):
+        key = (str(user_id), secret_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, using, field_names, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return User.from_db(using, field_names, values)
+
+    def put(self, user):
+        if self.ttl <= 0:
+            return
+        # In model field order, as from_db() expects.
+        field_names = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in self.fields
+        ]
+        values = [getattr(user, name) for name in field_names]
+        entry = (time.monotonic() + self.ttl, user._state.db, field_names, values)
+        with self._lock:
+            self._entries[(str(user.pk), user.secret_key)] = entry
+            self._entries.move_to_end((str(user.pk), user.secret_key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == str(user_id)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def get_authenticated_user(user_id, secret_key):
+    """The user a token names, if its secret key is still the current one."""
+    user = principal_cache.get(user_id, secret_key)
+    if user is not None:
+        return user
+    try:
+        user = User.objects.get(id=user_id)
+    except (User.DoesNotExist, ValueError):
+        raise exceptions.AuthenticationFailed("User not found")
+    if user.secret_key != secret_key:
+        raise exceptions.AuthenticationFailed("Invalid credentials")
+    principal_cache.put(user)
+    return user
+
+
+async def aget_authenticated_user(user_id, secret_key):
+    """Async variant of get_authenticated_user for the websocket consumers."""
+    user = principal_cache.get(user_id, secret_key)
+    if user is not None:
+        return user
+    try:
+        user = await User.objects.aget(id=user_id)
+    except (User.DoesNotExist, ValueError):
+        raise exceptions.AuthenticationFailed("User not found")
+    if user.secret_key != secret_key:
+        raise exceptions.AuthenticationFailed("Invalid credentials")
+    principal_cache.put(user)
+    return user
+
+
 class CustomAuthentication(authentication.BaseAuthentication):
     """
     Custom authentication class for DRF.
@@ -71,17 +183,10 @@ class CustomAuthentication(authentication.BaseAuthentication):
         user_id = decoded_data.get("user_id")
         secret_key = decoded_data.get("secret_key")
 
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            raise exceptions.AuthenticationFailed("User not found")
-
-        if user.secret_key != secret_key:
-            raise exceptions.AuthenticationFailed("Invalid credentials")
+        user = get_authenticated_user(user_id, secret_key)
 
-        user.last_active_on = timezone.now()
-        user.save()
-        
+        # Buffered and written in batches, so reads stay read-only.
+        activity_tracker.touch(user.id)
 
         return (user, None)
 
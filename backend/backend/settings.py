@@ -91,6 +91,8 @@ TEMPLATES = [
 # WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = "backend.asgi.application"
 
+TEST_RUNNER = "backend.test_runner.TestRunner"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -155,9 +157,80 @@ DB_PREFIX = "pulikids_"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+# Cache Settings
+# "locmem" keeps a per-process cache, "file" shares one on disk between the
+# processes of a host and "redis" shares one across hosts.
+CACHE_BACKEND = config("CACHE_BACKEND", "locmem")
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pulikids",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("CACHE_LOCATION", "redis://localhost:6379/1"),
+    },
+}
+CACHES = {
+    "default": {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        "KEY_PREFIX": DB_PREFIX,
+        "OPTIONS": {"MAX_ENTRIES": 10000} if CACHE_BACKEND != "redis" else {},
+    }
+}
+
+
 # Django Channel Settings.
-# InMemoryChannleLayer For Testing and Local Developement
-CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+# "memory" keeps groups inside one process (testing and local development),
+# "sqlite" shares them between the daphne processes of a host through a file
+# and "redis" shares them across hosts.
+CHANNEL_LAYER = config("CHANNEL_LAYER", "memory")
+CHANNEL_LAYER_BACKENDS = {
+    "memory": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+    "sqlite": {
+        "BACKEND": "apps.chat.layers.SQLiteChannelLayer",
+        "CONFIG": {
+            "location": config(
+                "CHANNEL_LAYER_LOCATION", str(BASE_DIR / ".channels.sqlite3")
+            ),
+        },
+    },
+    "redis": {
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {
+            "hosts": [config("CHANNEL_LAYER_LOCATION", "redis://localhost:6379/2")],
+        },
+    },
+}
+CHANNEL_LAYERS = {"default": CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER]}
+# A comma-separated list of locations runs the chosen layer once per location
+# and spreads the chat groups over them by consistent hashing.
+CHANNEL_LAYER_SHARDS = config(
+    "CHANNEL_LAYER_SHARDS",
+    "",
+    cast=lambda v: [s.strip() for s in v.split(",") if s.strip()],
+)
+if CHANNEL_LAYER_SHARDS:
+    CHANNEL_LAYERS["default"] = {
+        "BACKEND": "apps.chat.layers.ShardedChannelLayer",
+        "CONFIG": {
+            "shards": [
+                {
+                    "BACKEND": CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER]["BACKEND"],
+                    "CONFIG": {
+                        "memory": {},
+                        "sqlite": {"location": location},
+                        "redis": {"hosts": [location]},
+                    }[CHANNEL_LAYER],
+                }
+                for location in CHANNEL_LAYER_SHARDS
+            ],
+        },
+    }
 
 
 # DRF Settigs
@@ -171,7 +244,7 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'apps.base.pagination.FlexiblePagination',
     'PAGE_SIZE': 25
 
 }
@@ -179,6 +252,56 @@ REST_FRAMEWORK = {
 # Pointing to Custom User Model.
 AUTH_USER_MODEL = "users.User"
 
+# User activity tracking: last_active_on is recorded at most once per
+# granularity and written to the database every flush interval (seconds).
+USER_ACTIVITY_GRANULARITY = config("USER_ACTIVITY_GRANULARITY", 60, cast=int)
+USER_ACTIVITY_FLUSH_INTERVAL = config("USER_ACTIVITY_FLUSH_INTERVAL", 30, cast=int)
+
+# Authenticated users are cached per process for this many seconds, keyed
+# by (user_id, secret_key); a TTL of 0 disables the cache.
+AUTH_PRINCIPAL_CACHE_TTL = config("AUTH_PRINCIPAL_CACHE_TTL", 60, cast=int)
+AUTH_PRINCIPAL_CACHE_SIZE = config("AUTH_PRINCIPAL_CACHE_SIZE", 10000, cast=int)
+
+# Chat message persistence: "immediate" writes each message before it is
+# broadcast, "buffered" broadcasts first and writes in batches (see
+# apps/chat/persistence.py). Buffered mode requires SNOWFLAKE_WORKER_ID,
+# unique per process (0-31).
+CHAT_PERSISTENCE = config("CHAT_PERSISTENCE", "immediate")
+CHAT_BUFFER_FLUSH_INTERVAL_MS = config("CHAT_BUFFER_FLUSH_INTERVAL_MS", 50, cast=int)
+CHAT_BUFFER_BATCH_SIZE = config("CHAT_BUFFER_BATCH_SIZE", 100, cast=int)
+CHAT_BUFFER_DURABLE = config("CHAT_BUFFER_DURABLE", False, cast=bool)
+SNOWFLAKE_WORKER_ID = config("SNOWFLAKE_WORKER_ID", default=None)
+
+# Reconnecting chat sockets replay missed messages in batches of this size,
+# up to the limit per room; beyond it clients fall back to the history API.
+CHAT_REPLAY_BATCH_SIZE = config("CHAT_REPLAY_BATCH_SIZE", 100, cast=int)
+CHAT_REPLAY_LIMIT = config("CHAT_REPLAY_LIMIT", 1000, cast=int)
+
+# Presence: changes are broadcast at most once per interval per room, online
+# entries expire after PRESENCE_TTL seconds without a heartbeat, and a user's
+# typing is relayed at most once per PRESENCE_TYPING_INTERVAL seconds.
+PRESENCE_BROADCAST_INTERVAL = config("PRESENCE_BROADCAST_INTERVAL", 1.0, cast=float)
+PRESENCE_TTL = config("PRESENCE_TTL", 60, cast=int)
+PRESENCE_TYPING_INTERVAL = config("PRESENCE_TYPING_INTERVAL", 3, cast=float)
+
+# Chat flow control. Every socket may send CHAT_RATE_LIMIT frames a second
+# (bursts of CHAT_RATE_BURST) and every room takes CHAT_ROOM_RATE_LIMIT
+# messages a second per process. Each socket buffers at most
+# CHAT_SEND_QUEUE_SIZE outgoing frames; past that the policy either drops
+# the oldest ("drop") or closes the socket ("disconnect").
+CHAT_MAX_MESSAGE_BYTES = config("CHAT_MAX_MESSAGE_BYTES", 4096, cast=int)
+CHAT_RATE_LIMIT = config("CHAT_RATE_LIMIT", 10, cast=float)
+CHAT_RATE_BURST = config("CHAT_RATE_BURST", 40, cast=int)
+CHAT_ROOM_RATE_LIMIT = config("CHAT_ROOM_RATE_LIMIT", 30, cast=float)
+CHAT_ROOM_RATE_BURST = config("CHAT_ROOM_RATE_BURST", 100, cast=int)
+CHAT_SEND_QUEUE_SIZE = config("CHAT_SEND_QUEUE_SIZE", 256, cast=int)
+CHAT_SLOW_CONSUMER_POLICY = config("CHAT_SLOW_CONSUMER_POLICY", "drop")
+
+# WebSocket heartbeat: quiet sockets are pinged after WS_HEARTBEAT_INTERVAL
+# seconds and closed after WS_IDLE_TIMEOUT (see apps/chat/heartbeat.py).
+WS_HEARTBEAT_INTERVAL = config("WS_HEARTBEAT_INTERVAL", 25, cast=int)
+WS_IDLE_TIMEOUT = config("WS_IDLE_TIMEOUT", 75, cast=int)
+
 
 # Email Settings
 EMAIL_HOST = config("EMAIL_HOST", "smtp.gmail.com")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Keeps the write-behind buffers (user activity, buffered chat messages)
+    inside the test database's lifetime: no background flushing while tests
+    run, and whatever is still queued is written before the database goes.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.USER_ACTIVITY_FLUSH_INTERVAL = 0
+
+    def teardown_databases(self, old_config, **kwargs):
+        from apps.chat.persistence import writer
+        from apps.users.activity import tracker
+
+        tracker.stop()
+        writer.stop()
+        super().teardown_databases(old_config, **kwargs)
@@ -97,7 +97,7 @@ const LiveChat = ({ courseId }) => {
             <Box ref={chatContainerRef} sx={{ maxHeight: 300, overflowY: 'auto', p: 1 }}>
                 <List>
                     {messages.map((msg) => (
-                        <ListItem key={msg.id} sx={{ background: msg.sender.email === user.email ? '#DCF8C6' : '#EAEAEA', borderRadius: 2, mb: 1 }}>
+                        <ListItem key={msg.id} sx={{ background: msg.sender.id === user.id ? '#DCF8C6' : '#EAEAEA', borderRadius: 2, mb: 1 }}>
                             <ListItemText
                                 primary={msg.message}
                                 secondary={`${msg.sender.name} • ${formatTimestamp(msg.timestamp)}`}